@@ -1,36 +1,24 @@
-import requests
-import pandas as pd
-import json
-import os
+import argparse
 import seaborn as sns
 import matplotlib.pyplot as plt
+import processing
+import batch
+import aggregate
+import versions
 
 # Define functions
 
+# Report progress of the processing core on the terminal
+def print_report(level, message):
+    print(message)
+
 def download_file(link, output_folder="."):
-    try:
-        response = requests.get(link)
-        if response.status_code == 200:
-            file_name = os.path.join(output_folder, link.split("/")[-1])
-            with open(file_name, 'wb') as file:
-                file.write(response.content)
-            print(f'File Download Complete: {file_name}')
-            return file_name
-        else:
-            if response.status_code == 404:
-                print(f'File not found (404 Error) for the specified date: {link}')
-            else:
-                print(f'Error occurred during download ({response.status_code} Error) for the specified date: {link}')
-            return None
-    except Exception as e:
-        print(f'Error: {e}')
-        return None
+    return processing.download(link, output_folder, report=print_report).file_name
 
 def filter_file(file_name):
-    xlsx_file = file_name
-    df = pd.read_excel(xlsx_file)
-    filtered_df = df[(df['SIDE_DESCR'] == 'Sell') & (df['CLASSIFICATION'] == 'Imports')]
-    sum_of_total_trades = filtered_df.groupby('SORT')['TOTAL_TRADES'].sum().reset_index()
+    # Keep every column of the Sell/Imports rows so they can be saved below
+    filtered_df = processing.parse(file_name, columns=None)
+    sum_of_total_trades = processing.aggregate_imports(filtered_df)
     print(sum_of_total_trades.to_string(index=False))
 
     user_response = input("Do you want to save the changes to a new XLSX file? (yes/no): ")
@@ -44,38 +32,23 @@ def filter_file(file_name):
     return sum_of_total_trades
 
 def df_to_json(df, print_json=True):
-    try:
-        json_data = df.to_json(orient='records', indent=4)                
-        print()
-        if is_valid_json(json_data):  # Check for valid JSON data
-            print("Valid JSON data")
-            if print_json:
-                print("Aggregated Data in JSON Format:")
-                print(json_data)
-            return json_data
-        else:
-            print("Not valid JSON data")
-            return None
-    except Exception as e:
-        print(f'Error during JSON conversion: {e}')
+    json_data = processing.to_json(df, report=print_report)
+    print()
+    if json_data is None:
+        print("Not valid JSON data")
         return None
+    print("Valid JSON data")
+    if print_json:
+        print("Aggregated Data in JSON Format:")
+        print(json_data)
+    return json_data
 
 def create_bar_plot(df):
-    sns.set(style="whitegrid")
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x='SORT', y='TOTAL_TRADES', data=df)
-    plt.xlabel('SORT (Period of Trade)')
-    plt.ylabel('TOTAL_TRADES (Sum of Trades)')
-    plt.title('Bar Plot: Total Trades vs. Sort')
+    processing.draw(plt.figure(figsize=(10, 6)), df, 'bar')
     plt.show()
 
 def create_line_plot(df):
-    sns.set(style="whitegrid")
-    plt.figure(figsize=(10, 6))
-    sns.lineplot(x='SORT', y='TOTAL_TRADES', data=df, marker='o')
-    plt.xlabel('SORT (Period of Trade)')
-    plt.ylabel('TOTAL_TRADES (Sum of Trades)')
-    plt.title('Line Plot: Total Trades vs. Sort')
+    processing.draw(plt.figure(figsize=(10, 6)), df, 'line')
     plt.show()
 
 def create_pie_chart(df):
@@ -89,23 +62,59 @@ def create_pie_chart(df):
     plt.show()
 
 def write_json_to_file(json_data, file_name):
+    processing.write_text(json_data, f"{file_name}.json", report=print_report)
+
+def run_batch(start, end, output_folder="output_data"):
     try:
-        with open(f"{file_name}.json", 'w') as file:
-            file.write(json_data)
-        print(f"JSON data has been written to {file_name}.json successfully.")
-    except Exception as e:
-        print(f"An error occurred while writing to the file: {e}")  # "ValueError," "IOError," or "RequestException,"
-        print(f'An error of type {type(e).__name__} occurred: {str(e)}')
-
-def is_valid_json(my_json):
-    try:
-        json.loads(my_json)
-        return True
-    except json.JSONDecodeError:
-        return False
+        combined, missing_dates = batch.process_range(start, end, output_folder)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    print(combined.to_string(index=False))
+    if missing_dates:
+        print(f"No file available for: {', '.join(missing_dates)}")
+    return combined
+
+def run_aggregations(selected_date, specs, output_folder="output_data"):
+    files = batch.fetch_range([selected_date], output_folder)
+    file_name = files[selected_date]
+    if file_name is None:
+        print(f"No file available for: {selected_date}")
+        return None
+    df = processing.parse(file_name, columns=aggregate.needed_columns(specs), filters={})
+    results = processing.aggregate_specs(df, specs)
+    for spec, result in zip(specs, results):
+        print(f"{aggregate.spec_to_dict(spec)}")
+        print(result.to_string(index=False))
+        print()
+    return results
 
 if __name__ == "__main__":
-    base_url = "https://www.enexgroup.gr/documents/20126/200106/YYYYMMDD_EL-DAM_Results_EN_v##.xlsx"
+    parser = argparse.ArgumentParser(description="Retrieve and aggregate ENEX EL-DAM results.")
+    parser.add_argument("--start", help="First date of a batch run (YYYYMMDD)")
+    parser.add_argument("--end", help="Last date of a batch run (YYYYMMDD)")
+    parser.add_argument("--output-folder", default="output_data", help="Folder for the downloaded files of a batch run")
+    parser.add_argument("--date", help="Date to aggregate without prompts (YYYYMMDD)")
+    parser.add_argument("--side", help="SIDE_DESCR value(s) to keep, comma separated, '*' for all (default: Sell)")
+    parser.add_argument("--classification", help="CLASSIFICATION value(s) to keep, comma separated, '*' for all (default: Imports)")
+    parser.add_argument("--group-by", help="Columns to group by, comma separated (default: SORT)")
+    parser.add_argument("--value", help="Column to reduce (default: TOTAL_TRADES)")
+    parser.add_argument("--agg", help="Reducers, comma separated: sum, mean, min, max, count (default: sum)")
+    args = parser.parse_args()
+
+    if args.date:
+        try:
+            spec = aggregate.make_spec(args.side, args.classification, args.group_by, args.value, args.agg)
+            batch.parse_date(args.date)
+        except ValueError as e:
+            print(f"Error: {e}")
+        else:
+            run_aggregations(args.date, [spec], args.output_folder)
+        raise SystemExit
+
+    if args.start or args.end:
+        run_batch(args.start or args.end, args.end or args.start, args.output_folder)
+        raise SystemExit
 
     user_input = input("Enter a date in YYYYMMDD format: ")
 
@@ -133,8 +142,11 @@ if __name__ == "__main__":
             
         else:
             version = '01'
+            latest_version = versions.resolve_latest(user_input)
+            if latest_version is not None and latest_version != version:
+                print(f"Versions v01 to v{latest_version} are available for the given date.")
             while True:
-                formatted_url = base_url.replace("YYYY", str(year)).replace("MM", str(month).zfill(2)).replace("DD", str(day).zfill(2)).replace("##", version)
+                formatted_url = processing.format_url(user_input, version)
                 downloaded_file = download_file(formatted_url)
 
                 if downloaded_file is not None:
@@ -162,11 +174,10 @@ if __name__ == "__main__":
                     # print(f"Pie Chart: Distribution of SORT by Total Trades")
                     # create_pie_chart(filtered_data)
 
-                next_version = f'v{int(version[1:]) + 1:02d}'
-                next_version_exists = requests.head(base_url.replace("YYYY", str(year)).replace("MM", str(month).zfill(2)).replace("DD", str(day).zfill(2)).replace("##", next_version))
-
-                if next_version_exists.status_code == 200:
-                    user_response = input(f"Do you want to check version {next_version}? (yes/no): ")
+                # Versions are resolved once for the date with concurrent HEAD probes
+                next_version = f'{int(version) + 1:02d}'
+                if latest_version is not None and int(next_version) <= int(latest_version):
+                    user_response = input(f"Do you want to check version v{next_version}? (yes/no): ")
                     if user_response.lower() == "yes":
                         version = next_version
                     else:
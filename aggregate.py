@@ -0,0 +1,132 @@
+from collections import namedtuple
+
+import pandas as pd
+
+reducers = ('sum', 'mean', 'min', 'max', 'count')
+
+# filters maps a column to a value or a list of values, group_by is a tuple of
+# columns, value is the column being reduced and reducers a tuple of reducer names
+AggregationSpec = namedtuple('AggregationSpec', ['filters', 'group_by', 'value', 'reducers'])
+
+# The Sell/Imports total per SORT that /process_data has always returned
+default_spec = AggregationSpec({'SIDE_DESCR': 'Sell', 'CLASSIFICATION': 'Imports'}, ('SORT',), 'TOTAL_TRADES', ('sum',))
+
+
+def _split(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return list(value)
+
+
+def make_spec(side=None, classification=None, group_by=None, value=None, agg=None, filters=None):
+    """Build a spec from request or CLI parameters, defaulting to ``default_spec``.
+
+    ``side`` and ``classification`` accept a comma separated list; ``filters``
+    adds equality filters on any other column.
+    """
+    spec_filters = dict(filters or {})
+    for column, selected in (('SIDE_DESCR', side), ('CLASSIFICATION', classification)):
+        values = _split(selected) if selected is not None else _split(default_spec.filters[column])
+        if values and values != ['*']:
+            spec_filters[column] = values[0] if len(values) == 1 else values
+    spec_reducers = tuple(_split(agg)) or default_spec.reducers
+    unknown = [name for name in spec_reducers if name not in reducers]
+    if unknown:
+        raise ValueError(f"Unknown reducer(s): {', '.join(unknown)}. Use {', '.join(reducers)}.")
+    return AggregationSpec(
+        spec_filters,
+        tuple(_split(group_by)) or default_spec.group_by,
+        value or default_spec.value,
+        spec_reducers,
+    )
+
+
+def spec_from_dict(data):
+    return make_spec(data.get('side'), data.get('classification'), data.get('group_by'),
+                     data.get('value'), data.get('agg'), data.get('filters'))
+
+
+def spec_to_dict(spec):
+    return {'filters': spec.filters, 'group_by': list(spec.group_by), 'value': spec.value,
+            'reducers': list(spec.reducers)}
+
+
+def needed_columns(specs):
+    columns = []
+    for spec in specs:
+        for column in list(spec.filters) + list(spec.group_by) + [spec.value]:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def aggregate(df, specs):
+    """Answer several specs with a single groupby over ``df``.
+
+    The frame is grouped once on the union of every filter and group column,
+    collecting sum, count, min and max of every value column. Each spec is
+    then answered from that (much smaller) partial aggregate: its filters
+    select partial groups, which are combined per its own group keys.
+    Returns one DataFrame per spec, with a column per reducer named
+    ``<value>_<reducer>``, or just ``<value>`` for a single reducer.
+    """
+    specs = list(specs)
+    keys = []
+    for spec in specs:
+        for column in list(spec.filters) + list(spec.group_by):
+            if column not in keys:
+                keys.append(column)
+    values = []
+    for spec in specs:
+        if spec.value not in values:
+            values.append(spec.value)
+
+    missing = [column for column in keys + values if column not in df.columns]
+    if missing:
+        raise KeyError(f"Columns not found: {', '.join(missing)}")
+
+    frame = df[keys + [value for value in values if value not in keys]].copy()
+    for column in keys:
+        if frame[column].dtype == object:
+            frame[column] = frame[column].astype('category')
+    for value in values:
+        # Compact frames hold float32 values; sum them at full precision
+        if value not in keys and frame[value].dtype.kind == 'f':
+            frame[value] = frame[value].astype('float64')
+    # Keep rows with a missing key: a column only one spec filters or groups on
+    # must not drop rows from the others, which apply their own filters in _answer
+    partial = frame.groupby(keys, observed=True, sort=False, dropna=False).agg(
+        **{f"{value}__{name}": (value, name) for value in values for name in ('sum', 'count', 'min', 'max')}
+    ).reset_index()
+
+    return [_answer(partial, spec) for spec in specs]
+
+
+def _answer(partial, spec):
+    mask = pd.Series(True, index=partial.index)
+    for column, selected in spec.filters.items():
+        if isinstance(selected, (list, tuple, set)):
+            mask &= partial[column].isin(list(selected))
+        else:
+            mask &= partial[column] == selected
+    rows = partial[mask]
+    value = spec.value
+    combined = rows.groupby(list(spec.group_by), observed=True).agg(
+        sum=(f"{value}__sum", 'sum'),
+        count=(f"{value}__count", 'sum'),
+        min=(f"{value}__min", 'min'),
+        max=(f"{value}__max", 'max'),
+    )
+    combined['mean'] = combined['sum'] / combined['count']
+    result = combined[list(spec.reducers)]
+    if len(spec.reducers) == 1:
+        result.columns = [value]
+    else:
+        result.columns = [f"{value}_{name}" for name in spec.reducers]
+    result = result.reset_index()
+    for column in spec.group_by:
+        if isinstance(result[column].dtype, pd.CategoricalDtype):
+            result[column] = result[column].astype(object)
+    return result
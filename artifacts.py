@@ -0,0 +1,176 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: the date lock only covers the threads of one process
+    fcntl = None
+
+import metrics
+
+# How processed artifacts (downloaded XLSX, filtered XLSX, JSON, charts) reach the date folder:
+#   async - written by a background thread once the response has been built (default)
+#   sync  - written before the response is returned
+#   off   - nothing is written; results are only kept in the in-memory cache
+modes = ('async', 'sync', 'off')
+mode = os.environ.get("ENEX_PERSIST", "async").lower()
+if mode not in modes:
+    mode = 'async'
+
+logger = logging.getLogger("enex.artifacts")
+
+# Seconds a request waits for another worker processing the same date before going ahead anyway
+lock_timeout = float(os.environ.get("ENEX_LOCK_TIMEOUT", 120))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _xlsx(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _json(df):
+    import processing
+    return processing.to_json(df).encode()
+
+
+# An artifact is (path, encoding, payload); frames are only encoded when written,
+# so the request path never pays for to_excel or an indented JSON copy
+encoders = {
+    'raw': bytes,
+    'xlsx': _xlsx,
+    'json': _json,
+}
+
+
+def date_folder(output_folder, selected_date):
+    """Folder holding the artifacts of a date, keyed on the zero-padded YYYYMMDD string."""
+    if len(selected_date) != 8 or not selected_date.isdigit():
+        raise ValueError(f"Invalid date: {selected_date!r}")
+    return os.path.join(output_folder, selected_date)
+
+
+class DateLock:
+    """Exclusive lock on one date across the threads of this process and other workers.
+
+    Threads queue on a process-wide ``threading.Lock``; processes on an
+    ``flock`` of ``<output_folder>/.locks/<date>.lock``. ``acquire`` gives up
+    after ``timeout`` seconds and returns False, so a stuck worker delays
+    others instead of blocking them. ``release`` may be called from any
+    thread and more than once.
+    """
+
+    _thread_locks = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, output_folder, selected_date, timeout=None):
+        self.path = os.path.join(output_folder, ".locks", f"{selected_date}.lock")
+        self.timeout = lock_timeout if timeout is None else timeout
+        with DateLock._registry_lock:
+            self._thread_lock = DateLock._thread_locks.setdefault(self.path, threading.Lock())
+        self._file = None
+        self._held = False
+        self._release_lock = threading.Lock()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            return False
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'a')
+            while True:
+                try:
+                    fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        self._file.close()
+                        self._file = None
+                        self._thread_lock.release()
+                        return False
+                    time.sleep(0.05)
+        self._held = True
+        return True
+
+    def release(self):
+        with self._release_lock:
+            if not self._held:
+                return
+            self._held = False
+            if self._file is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def write_atomic(path, data):
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".artifact-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def write_all(items, on_written=None):
+    for path, encoding, payload in items:
+        with metrics.stage('persist', file=os.path.basename(path)):
+            write_atomic(path, encoders[encoding](payload))
+    if on_written is not None:
+        on_written()
+
+
+def _write_logged(items, on_written):
+    try:
+        write_all(items, on_written)
+    except Exception:
+        logger.exception("Writing %s failed", ", ".join(path for path, _, _ in items))
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # One writer keeps disk writes off the request threads without competing for the disk
+            _pool = ThreadPoolExecutor(1, thread_name_prefix="artifact-writer")
+        return _pool
+
+
+def persist(items, on_written=None, persist_mode=None):
+    """Write artifacts atomically according to ``persist_mode`` (default: ``mode``).
+
+    ``on_written`` is called once every item is on disk; it is not called
+    when persistence is off. Returns the pending future in async mode.
+    """
+    persist_mode = persist_mode or mode
+    if persist_mode == 'off' or not items:
+        return None
+    if persist_mode == 'sync':
+        write_all(items, on_written)
+        return None
+    return _executor().submit(_write_logged, list(items), on_written)
@@ -0,0 +1,325 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+import pandas as pd
+from quart import Quart, Response, g, jsonify, render_template, request
+
+import artifacts
+import batch
+import charts
+import formats
+import http_client
+import metrics
+import processing
+from pipeline import (cached_after_lock, chart_cache, chart_key, date_folder_for, lookup_cached, normalize_version,
+                      output_folder, persist_chart, persist_result, process_content, release_when_written,
+                      requested_specs, run_aggregations, stored_chart)
+from result_cache import content_digest
+
+# Async variant of flask_app.py exposing the same routes. Run it with an ASGI server:
+#   uvicorn asgi_app:app --workers 4
+app = Quart(__name__, template_folder="templates")
+# Same switches as flask_app.create_app
+app.config['PROFILING'] = os.environ.get("ENEX_PROFILING", "0") == "1"
+app.config['TRACE_MEMORY'] = os.environ.get("ENEX_TRACE_MEMORY", "0") == "1"
+
+# Parsing and plotting are CPU bound and pyplot is not thread safe, so they run in processes
+cpu_workers = int(os.environ.get("ENEX_CPU_WORKERS", os.cpu_count() or 1))
+_cpu_pool = None
+_client = None
+
+# In-flight fetches keyed by (date, version), shared by concurrent requests
+_in_flight = {}
+
+
+@app.before_serving
+async def startup():
+    global _cpu_pool, _client
+    # Spawned like batch.parse_files' pool, so no worker starts with a lock held by another thread
+    _cpu_pool = ProcessPoolExecutor(cpu_workers, mp_context=multiprocessing.get_context("spawn"))
+    _client = httpx.AsyncClient(
+        timeout=httpx.Timeout(http_client.read_timeout, connect=http_client.connect_timeout),
+        limits=httpx.Limits(max_connections=http_client.pool_size, max_keepalive_connections=http_client.pool_size),
+    )
+
+
+@app.after_serving
+async def shutdown():
+    await _client.aclose()
+    _cpu_pool.shutdown()
+
+
+# Request metrics, profiling and memory tracing, as in flask_app.py's blueprint
+@app.before_request
+async def start_request():
+    g.request_start = time.perf_counter()
+    metrics.in_flight.inc()
+    # X-Profile: cprofile|pyinstrument samples this request, when profiling is enabled
+    profile_kind = request.headers.get('X-Profile')
+    if profile_kind and app.config.get('PROFILING'):
+        g.profiler = metrics.Profiler(profile_kind.lower()).start()
+    if app.config.get('TRACE_MEMORY'):
+        g.memory_tracer = metrics.MemoryTracer().start()
+
+
+@app.after_request
+async def finish_request(response):
+    elapsed = time.perf_counter() - g.pop('request_start', time.perf_counter())
+    metrics.request_seconds.observe(elapsed, request.endpoint or 'unknown', response.status_code)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profile_folder = os.path.join(output_folder, 'profiles')
+        os.makedirs(profile_folder, exist_ok=True)
+        name = f"{(request.endpoint or 'unknown').replace('.', '_')}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        response.headers['X-Profile-File'] = profiler.stop(os.path.join(profile_folder, name))
+    memory_tracer = g.pop('memory_tracer', None)
+    if memory_tracer is not None:
+        response.headers['X-Memory-Peak'] = str(memory_tracer.stop(request.endpoint or 'unknown'))
+    return response
+
+
+@app.teardown_request
+async def end_request(exception=None):
+    metrics.in_flight.dec()
+
+
+# Download a file into memory, retrying transient failures like http_client.request
+async def fetch_content(link):
+    for attempt in range(http_client.max_retries + 1):
+        try:
+            response = await _client.get(link)
+        except httpx.TransportError:
+            metrics.upstream_errors.inc('GET')
+        else:
+            metrics.upstream_responses.inc('GET', response.status_code)
+            if response.status_code == 200:
+                metrics.downloaded_bytes.inc(amount=len(response.content))
+                return response.content, response.headers.get('ETag')
+            if response.status_code not in http_client.retry_statuses:
+                return None, None
+        if attempt < http_client.max_retries:
+            await asyncio.sleep(http_client.backoff_delay(attempt))
+    return None, None
+
+
+async def fetch_and_process(selected_date, date_folder, version, latest=True):
+    loop = asyncio.get_running_loop()
+    # single_flight covers this process; the date lock covers the other workers
+    lock = artifacts.DateLock(output_folder, selected_date)
+    await loop.run_in_executor(None, lock.acquire)
+    future = None
+    try:
+        cached_response = await loop.run_in_executor(None, cached_after_lock, selected_date, date_folder, version)
+        if cached_response is not None:
+            return cached_response
+        formatted_url = processing.format_url(selected_date, version)
+        content, etag = await fetch_content(formatted_url)
+        if content is None:
+            return None
+        if not etag:
+            etag = f"sha256:{content_digest(content)}"
+        (response_dict, items), recorded = await loop.run_in_executor(
+            _cpu_pool, metrics.run_collected, process_content, content, formatted_url.split("/")[-1], selected_date,
+            formatted_url, date_folder)
+        metrics.merge(recorded)
+        future = await loop.run_in_executor(
+            None, persist_result, selected_date, date_folder, version, formatted_url, etag, response_dict, items, latest)
+        return response_dict
+    finally:
+        release_when_written(lock, future)
+
+
+# Run fetch_and_process once per (date, version), however many requests ask for it
+async def single_flight(selected_date, date_folder, version, latest=True):
+    key = (selected_date, version, latest)
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch_and_process(selected_date, date_folder, version, latest))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def load_result(selected_date, requested_version=None):
+    date_folder = date_folder_for(selected_date)
+    loop = asyncio.get_running_loop()
+    cached_response, version = await loop.run_in_executor(
+        None, lookup_cached, selected_date, date_folder, requested_version)
+    if cached_response is not None:
+        return cached_response
+    # A version asked for explicitly is cached under its own key, not as the newest one
+    return await single_flight(selected_date, date_folder, version, latest=requested_version is None)
+
+
+def requested_format():
+    fmt = formats.negotiate(request)
+    if fmt is None:
+        return None, (jsonify({'error': f"Unsupported format. Use one of {sorted(formats.mimetypes)}."}), 406)
+    if fmt == 'arrow' and not formats.arrow_available():
+        return None, (jsonify({'error': 'Arrow responses require pyarrow.'}), 406)
+    return fmt, None
+
+
+# Stream DataFrame chunks as NDJSON, CSV or Arrow IPC, encoding each chunk off the event loop
+def streamed(frames, fmt, headers=None):
+    loop = asyncio.get_running_loop()
+    encoded = formats.stream(frames, fmt)
+
+    async def body():
+        while True:
+            chunk = await loop.run_in_executor(None, next, encoded, None)
+            if chunk is None:
+                break
+            yield chunk
+
+    return Response(body(), mimetype=formats.mimetypes[fmt], headers=headers)
+
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/')
+async def welcome():
+    return await render_template('index.html')
+
+
+@app.route('/process_data', methods=['GET', 'POST'])
+async def process_data():
+    if request.method == 'GET':
+        params = request.args
+    else:
+        params = (await request.get_json(silent=True)) or {}
+    selected_date = params.get('date', None)
+    if not selected_date or len(selected_date) != 8 or not selected_date.isdigit():
+        return jsonify({'error': 'Invalid date format. Please provide a date in YYYYMMDD format.'}), 400
+    try:
+        requested_version = normalize_version(params.get('version', None))
+        specs = requested_specs(params, json_body=request.method == 'POST')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    fmt, error = requested_format()
+    if error:
+        return error
+    if specs and fmt != 'json':
+        return jsonify({'error': 'Aggregations are only returned as JSON.'}), 400
+
+    try:
+        response_dict = await load_result(selected_date, requested_version)
+    except MemoryError as e:
+        # ENEX_MEMORY_BUDGET_MB applies in the pool workers too
+        return jsonify({'error': str(e) or 'Not enough memory to process this file.'}), 503
+    except Exception as e:
+        return jsonify({'error': f'Error occurred during data processing: {e}'}), 500
+    if response_dict is None:
+        return jsonify({'error': 'Error occurred during data processing. Unable to download the file.'}), 500
+    if fmt != 'json':
+        df = pd.DataFrame(response_dict['data']['json_data'], columns=['SORT', 'TOTAL_TRADES'])
+        return streamed([df], fmt, {'X-Source-URL': response_dict['data']['selected_date_url']})
+    if specs:
+        loop = asyncio.get_running_loop()
+        try:
+            aggregations = await loop.run_in_executor(None, run_aggregations, selected_date, response_dict, specs)
+        except (KeyError, ValueError, TypeError) as e:
+            # Unknown columns (KeyError, or ArrowInvalid from the store) and non-numeric values
+            return jsonify({'error': f'Invalid aggregation: {e}'}), 400
+        response_dict = dict(response_dict, data=dict(response_dict['data'], aggregations=aggregations))
+    return jsonify(response_dict), 200
+
+
+def render_records(selected_date, records, kind, fmt):
+    with metrics.stage('render_chart', date=selected_date, kind=kind, format=fmt):
+        return charts.render_chart(pd.DataFrame(records, columns=['SORT', 'TOTAL_TRADES']), kind, fmt)
+
+
+@app.route('/charts/<selected_date>/<kind>.<fmt>')
+async def chart(selected_date, kind, fmt):
+    if len(selected_date) != 8 or not selected_date.isdigit():
+        return jsonify({'error': 'Invalid date format. Please provide a date in YYYYMMDD format.'}), 400
+    if kind not in charts.kinds or fmt not in charts.formats:
+        return jsonify({'error': f"Unknown chart. Use one of {sorted(charts.kinds)} as {sorted(charts.formats)}."}), 404
+    try:
+        requested_version = normalize_version(request.args.get('version', None))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response_dict = await load_result(selected_date, requested_version)
+    if response_dict is None:
+        return jsonify({'error': 'Error occurred during data processing. Unable to download the file.'}), 500
+
+    key = chart_key(selected_date, response_dict, kind, fmt)
+    cached_chart = chart_cache.get(key)
+    if cached_chart is None:
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(None, stored_chart, response_dict, kind, fmt)
+        if body is not None:
+            cached_chart = chart_cache.put(key, body)
+        else:
+            body, recorded = await loop.run_in_executor(
+                _cpu_pool, metrics.run_collected, render_records, selected_date, response_dict['data']['json_data'],
+                kind, fmt)
+            metrics.merge(recorded)
+            cached_chart = chart_cache.put(key, body)
+            persist_chart(response_dict, kind, fmt, body)
+    body, etag = cached_chart
+
+    if request.headers.get('If-None-Match') == etag:
+        response = Response(b'', status=304)
+    else:
+        response = Response(body, mimetype=charts.formats[fmt])
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
+@app.route('/process_range', methods=['GET', 'POST'])
+async def process_range():
+    if request.method == 'GET':
+        start = request.args.get('start', None)
+        end = request.args.get('end', None)
+    else:
+        payload = (await request.get_json(silent=True)) or {}
+        start = payload.get('start', None)
+        end = payload.get('end', None)
+    if not start or not end:
+        return jsonify({'error': 'Please provide start and end dates in YYYYMMDD format.'}), 400
+    fmt, error = requested_format()
+    if error:
+        return error
+
+    loop = asyncio.get_running_loop()
+    try:
+        combined, missing_dates = await loop.run_in_executor(
+            None, lambda: batch.process_range(start, end, output_folder))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if fmt != 'json':
+        return streamed(formats.chunks(combined), fmt, {'X-Missing-Dates': ','.join(missing_dates)})
+
+    return jsonify({
+        'status': 'success',
+        'message': 'Data processed successfully',
+        'data': {
+            'start': start,
+            'end': end,
+            'json_data': json.loads(combined.to_json(orient='records')),
+            'missing_dates': missing_dates,
+        },
+    }), 200
+
+
+# The history store and rollup queries are only served by flask_app.py
+@app.route('/history')
+@app.route('/timeseries')
+async def not_served():
+    return jsonify({'error': f'{request.path} is only served by flask_app.py.'}), 501
+
+
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -0,0 +1,138 @@
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+
+import pandas as pd
+import artifacts
+import dam_store
+import http_client
+import metrics
+import versions
+import processing
+import rollups
+
+# Longest range accepted in one batch
+max_range_days = 366
+
+
+def parse_date(selected_date):
+    if len(selected_date) != 8 or not selected_date.isdigit():
+        raise ValueError("Invalid date format. Please provide a date in YYYYMMDD format.")
+    return date(int(selected_date[:4]), int(selected_date[4:6]), int(selected_date[6:8]))
+
+
+# Every date from start to end (inclusive) in YYYYMMDD format
+def date_range(start, end):
+    first, last = parse_date(start), parse_date(end)
+    if last < first:
+        raise ValueError("The end date must not be before the start date.")
+    days = (last - first).days + 1
+    if days > max_range_days:
+        raise ValueError(f"The date range is limited to {max_range_days} days.")
+    return [(first + timedelta(days=offset)).strftime('%Y%m%d') for offset in range(days)]
+
+
+def date_folder_for(selected_date, output_folder):
+    return artifacts.date_folder(output_folder, selected_date)
+
+
+def _download(link, folder):
+    return http_client.download(link, folder).file_name
+
+
+# Download the newest version of a date, or the given one
+def _download_date(selected_date, output_folder, version, url):
+    if version is None:
+        version = versions.resolve_latest(selected_date, url)
+        if version is None:
+            return None
+    return _download(processing.format_url(selected_date, version, url), date_folder_for(selected_date, output_folder))
+
+
+# Download the files of several dates concurrently; missing dates map to None
+def fetch_range(dates, output_folder="output_data", version=None, max_downloads=8, url=None):
+    with ThreadPoolExecutor(max_downloads) as pool:
+        futures = {
+            selected_date: pool.submit(_download_date, selected_date, output_folder, version, url)
+            for selected_date in dates
+        }
+        return {selected_date: future.result() for selected_date, future in futures.items()}
+
+
+def _parse(file_name, output_folder):
+    if dam_store.available():
+        rows = dam_store.ingest_and_filter(file_name, dam_store.store_folder_for(output_folder))
+    else:
+        rows = processing.parse(file_name)
+    match = dam_store.file_pattern.search(os.path.basename(file_name))
+    if match:
+        rollups.add_day(match.group(1), match.group(2), rows, rollups.database_for(output_folder))
+    return processing.aggregate_imports(rows)
+
+
+# Parsing pools by size, created on first use and kept for later ranges: every worker is a
+# new interpreter that imports pandas and pyarrow. Workers are started as files arrive, so
+# a pool never starts more of them than the largest range it was given has files.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(max_workers):
+    with _pools_lock:
+        pool = _pools.get(max_workers)
+        if pool is None:
+            # Spawned, not forked: the caller (a threaded web worker) may hold the locks of its
+            # writer, prefetch and version-probe threads, and a forked child would inherit them locked
+            pool = _pools[max_workers] = ProcessPoolExecutor(
+                max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return pool
+
+
+# Parse the downloaded files across a process pool; the store under output_folder gets their rows
+def parse_files(files, max_workers=None, output_folder="output_data"):
+    available = {selected_date: file_name for selected_date, file_name in files.items() if file_name}
+    if not available:
+        return {}
+    pool = _pool(max_workers)
+    try:
+        results = list(pool.map(metrics.run_collected, itertools.repeat(_parse), available.values(),
+                                itertools.repeat(output_folder)))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the next range starts a new pool
+        with _pools_lock:
+            if _pools.get(max_workers) is pool:
+                del _pools[max_workers]
+        raise
+    frames = {}
+    for selected_date, (frame, recorded) in zip(available.keys(), results):
+        metrics.merge(recorded)
+        frames[selected_date] = frame
+    return frames
+
+
+def combine(frames):
+    if not frames:
+        return pd.DataFrame(columns=['DATE', 'SORT', 'TOTAL_TRADES'])
+    combined = pd.concat(
+        [frame.assign(DATE=selected_date) for selected_date, frame in sorted(frames.items())],
+        ignore_index=True,
+    )
+    return combined[['DATE', 'SORT', 'TOTAL_TRADES']]
+
+
+def process_range(start, end, output_folder="output_data", version=None, max_downloads=8, max_workers=None, url=None):
+    """Download and aggregate every date from ``start`` to ``end``.
+
+    Each date is fetched at its newest published version unless ``version``
+    is given. Returns ``(combined, missing_dates)`` where ``combined`` holds one row per
+    date and SORT, and ``missing_dates`` lists the dates ENEX had no file for.
+    """
+    dates = date_range(start, end)
+    files = fetch_range(dates, output_folder, version, max_downloads, url=url)
+    frames = parse_files(files, max_workers, output_folder)
+    missing_dates = [selected_date for selected_date in dates if selected_date not in frames]
+    return combine(frames), missing_dates
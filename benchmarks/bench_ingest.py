@@ -0,0 +1,51 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import pandas as pd  # noqa: E402
+
+import processing  # noqa: E402
+import xlsx_ingest  # noqa: E402
+from synthetic_dam import write_workbook  # noqa: E402
+
+
+# The filter_file implementation the front ends used before xlsx_ingest
+def baseline_filter_file(file_name):
+    df = pd.read_excel(file_name)
+    filtered_df = df[(df['SIDE_DESCR'] == 'Sell') & (df['CLASSIFICATION'] == 'Imports')]
+    return filtered_df.groupby('SORT')['TOTAL_TRADES'].sum().reset_index()
+
+
+def best_of(function, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pd.read_excel with the streaming xlsx_ingest reader.")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'synthetic_EL-DAM_Results_EN_v01.xlsx')
+        write_workbook(path, rows=args.rows)
+        print(f"Workbook: {args.rows} rows, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        baseline_time, expected = best_of(lambda: baseline_filter_file(path), args.repeat)
+        print(f"{'pd.read_excel (baseline)':<28}{baseline_time:8.3f} s")
+
+        engines = ['openpyxl'] + (['calamine'] if xlsx_ingest.calamine_available() else [])
+        for engine in engines:
+            elapsed, result = best_of(lambda: processing.filter_file(path, engine=engine), args.repeat)
+            pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+            print(f"{'xlsx_ingest/' + engine:<28}{elapsed:8.3f} s  {baseline_time / elapsed:5.1f}x")
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def worker(client, url, dates, counter, latencies, statuses):
+    while True:
+        index = counter[0]
+        if index >= len(dates):
+            return
+        counter[0] += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(url, params={'date': dates[index]})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        except httpx.HTTPError:
+            statuses['error'] = statuses.get('error', 0) + 1
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(base_url, dates, requests_count, concurrency, timeout):
+    schedule = [dates[index % len(dates)] for index in range(requests_count)]
+    counter, latencies, statuses = [0], [], {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, f"{base_url}/process_data", schedule, counter, latencies, statuses)
+                               for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, sorted(latencies), statuses
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fire concurrent /process_data requests and report throughput.")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Base URL of the running app")
+    parser.add_argument('--dates', nargs='+', default=['20231020', '20231021', '20231022'])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    elapsed, latencies, statuses = asyncio.run(run(args.url, args.dates, args.requests, args.concurrency, args.timeout))
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {elapsed:.2f} s")
+    print(f"throughput  {args.requests / elapsed:8.1f} req/s")
+    print(f"latency p50 {statistics.median(latencies) * 1000:8.1f} ms")
+    print(f"latency p95 {percentile(latencies, 0.95) * 1000:8.1f} ms")
+    print(f"latency max {latencies[-1] * 1000:8.1f} ms")
+    print(f"statuses    {statuses}")
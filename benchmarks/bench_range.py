@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import batch  # noqa: E402
+import processing  # noqa: E402
+from enex_stub import StubENEX  # noqa: E402
+
+
+# One date at a time, the way /process_data is called in a loop today
+def sequential(dates, folder, url):
+    frames = {}
+    for selected_date in dates:
+        file_name = batch._download(processing.format_url(selected_date, url=url),
+                                    batch.date_folder_for(selected_date, folder))
+        if file_name:
+            frames[selected_date] = processing.filter_file(file_name)
+    return batch.combine(frames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sequential and batched date-range processing against a local ENEX stub.")
+    parser.add_argument('--start', default='20230101')
+    parser.add_argument('--end', default='20230131')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--max-downloads', type=int, default=8)
+    args = parser.parse_args()
+
+    dates = batch.date_range(args.start, args.end)
+    with StubENEX(rows=args.rows, missing_dates=dates[-1:]) as stub, tempfile.TemporaryDirectory() as folder:
+        # Generate every workbook up front so the stub does not dominate the timings
+        for selected_date in dates:
+            stub.workbook(selected_date, 1)
+
+        start = time.perf_counter()
+        expected = sequential(dates, os.path.join(folder, 'sequential'), stub.base_url)
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        combined, missing_dates = batch.process_range(args.start, args.end, os.path.join(folder, 'batch'),
+                                                      max_downloads=args.max_downloads, url=stub.base_url)
+        batch_time = time.perf_counter() - start
+
+    assert combined.equals(expected), "batch and sequential results differ"
+    assert missing_dates == dates[-1:], missing_dates
+    print(f"{len(dates)} dates, {args.rows} rows each")
+    print(f"{'sequential':<12}{sequential_time:8.3f} s")
+    print(f"{'batch':<12}{batch_time:8.3f} s  {sequential_time / batch_time:5.1f}x")
@@ -0,0 +1,69 @@
+import argparse
+import os
+import subprocess
+import sys
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Modules that must not be loaded just by importing the app
+lazy_modules = ['pandas', 'matplotlib', 'seaborn', 'openpyxl', 'requests', 'pyarrow']
+
+first_response_script = """
+import sys, time
+start = time.perf_counter()
+import flask_app
+app = flask_app.create_app({'TESTING': True})
+response = app.test_client().get('/')
+elapsed = time.perf_counter() - start
+assert response.status_code == 200, response.status_code
+loaded = [name for name in %r if name in sys.modules]
+print(elapsed)
+print(','.join(loaded))
+"""
+
+
+# Cumulative import time of a module in microseconds, from python -X importtime
+def import_time(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=root, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def first_response():
+    result = subprocess.run([sys.executable, '-c', first_response_script % (lazy_modules,)],
+                            cwd=root, capture_output=True, text=True, check=True)
+    lines = result.stdout.splitlines() + ['']
+    return float(lines[0]), [name for name in lines[1].split(',') if name]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the cold start of flask_app against a time budget.")
+    parser.add_argument('--import-budget-ms', type=float, default=300)
+    parser.add_argument('--first-response-budget-ms', type=float, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    import_ms = min(import_time('flask_app') for _ in range(args.repeat)) / 1000
+    runs = [first_response() for _ in range(args.repeat)]
+    first_response_ms = min(elapsed for elapsed, _ in runs) * 1000
+    loaded = sorted({name for _, names in runs for name in names})
+
+    print(f"import flask_app       {import_ms:8.1f} ms (budget {args.import_budget_ms:.0f} ms)")
+    print(f"time to first response {first_response_ms:8.1f} ms (budget {args.first_response_budget_ms:.0f} ms)")
+    print(f"heavy modules loaded   {', '.join(loaded) or 'none'}")
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append("import time over budget")
+    if first_response_ms > args.first_response_budget_ms:
+        failures.append("time to first response over budget")
+    if loaded:
+        failures.append(f"eagerly imported: {', '.join(loaded)}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
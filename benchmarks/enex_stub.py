@@ -0,0 +1,128 @@
+import argparse
+import io
+import re
+import threading
+import zlib
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic_dam import write_workbook
+
+# Matches .../YYYYMMDD_EL-DAM_Results_EN_v##.xlsx
+file_pattern = re.compile(r"/(\d{8})_EL-DAM_Results_EN_v(\d{2})\.xlsx$")
+
+
+class StubENEX:
+    """Local HTTP server that serves generated EL-DAM workbooks.
+
+    Every date gets ``versions`` published versions unless it is listed in
+    ``missing_dates``. Workbooks are generated once and kept in memory.
+    Point the app at it with ``ENEX_BASE_URL=<stub.base_url>``.
+    """
+
+    def __init__(self, rows=2000, versions=1, missing_dates=(), host="127.0.0.1", port=0):
+        self.rows = rows
+        self.versions = versions
+        self.missing_dates = set(missing_dates)
+        self.requests = 0
+        # Full GET responses per request path, to check how often each file was downloaded
+        self.downloads = Counter()
+        self._files = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/documents/20126/200106/YYYYMMDD_EL-DAM_Results_EN_v##.xlsx"
+
+    def workbook(self, selected_date, version):
+        with self._lock:
+            key = (selected_date, version)
+            if key not in self._files:
+                buffer = io.BytesIO()
+                target = date(int(selected_date[:4]), int(selected_date[4:6]), int(selected_date[6:8]))
+                write_workbook(buffer, rows=self.rows, target_date=target, seed=int(selected_date) + version)
+                self._files[key] = buffer.getvalue()
+            return self._files[key]
+
+    def lookup(self, path):
+        match = file_pattern.search(path)
+        if not match:
+            return None
+        selected_date, version = match.group(1), int(match.group(2))
+        if selected_date in self.missing_dates or not 1 <= version <= self.versions:
+            return None
+        return self.workbook(selected_date, version)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, send_body):
+                with stub._lock:
+                    stub.requests += 1
+                body = stub.lookup(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = f'"{zlib.crc32(body):08x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                if send_body:
+                    with stub._lock:
+                        stub.downloads[self.path] += 1
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond(True)
+
+            def do_HEAD(self):
+                self._respond(False)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic EL-DAM workbooks over HTTP.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--versions', type=int, default=1)
+    args = parser.parse_args()
+    stub = StubENEX(rows=args.rows, versions=args.versions, port=args.port)
+    print(f"ENEX_BASE_URL={stub.base_url}")
+    stub.server.serve_forever()
@@ -0,0 +1,210 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, root)
+
+import pandas as pd  # noqa: E402
+
+import aggregate  # noqa: E402
+import charts  # noqa: E402
+import xlsx_ingest  # noqa: E402
+from enex_stub import StubENEX  # noqa: E402
+from stress_artifacts import start_workers  # noqa: E402
+from synthetic_dam import columns, generate_rows, write_workbook  # noqa: E402
+
+# Every run is appended here, one JSON object per line, so results can be compared over time
+default_history = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "history.jsonl")
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+# Peak resident set size of a process in MB (Linux /proc, else psutil when installed)
+def peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process(pid).memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1e6
+    except (ImportError, OSError):
+        return None
+
+
+def components(rows, repeat):
+    """Time the pipeline stages in-process on one synthetic workbook."""
+    results = {}
+    buffer = io.BytesIO()
+    write_workbook(buffer, rows=rows)
+    content = buffer.getvalue()
+    engines = ['openpyxl'] + (['calamine'] if xlsx_ingest.calamine_available() else [])
+    for engine in engines:
+        results[f"parse_{engine}_s"] = best_of(
+            lambda: xlsx_ingest.read_filtered(io.BytesIO(content), engine=engine), repeat)
+    # Full-width against compact frames of every row, as the history store reads them
+    for name, compact in (('full', False), ('compact', True)):
+        frame = xlsx_ingest.read_filtered(io.BytesIO(content), columns=None, filters={}, compact=compact)
+        results[f"frame_{name}_mb"] = frame.memory_usage(deep=True).sum() / 1024 / 1024
+        del frame
+
+    df = pd.DataFrame(list(generate_rows(rows)), columns=columns)
+    filtered = df[(df['SIDE_DESCR'] == 'Sell') & (df['CLASSIFICATION'] == 'Imports')]
+    results['aggregate_imports_s'] = best_of(lambda: xlsx_ingest.aggregate_imports(filtered), repeat)
+    specs = [aggregate.default_spec, aggregate.make_spec(side='*', classification='*', group_by='SORT,CLASSIFICATION',
+                                                         agg='sum,max')]
+    results['aggregate_specs_s'] = best_of(lambda: aggregate.aggregate(df, specs), repeat)
+
+    totals = xlsx_ingest.aggregate_imports(filtered)
+    for fmt in charts.formats:
+        results[f"render_bar_{fmt}_s"] = best_of(lambda: charts.render_chart(totals, 'bar', fmt), repeat)
+    return results
+
+
+def end_to_end(rows, cold_dates, requests_count, concurrency, persist):
+    """Cold, warm and concurrent /process_data requests against one app worker and the stub."""
+    first = date(2023, 1, 1)
+    dates = [(first + timedelta(days=offset)).strftime('%Y%m%d') for offset in range(cold_dates)]
+    os.environ['ENEX_PERSIST'] = persist
+    with StubENEX(rows=rows) as stub, tempfile.TemporaryDirectory() as folder:
+        # Generate every workbook up front so the stub does not dominate the timings
+        for selected_date in dates:
+            stub.workbook(selected_date, 1)
+        [(process, url)] = start_workers(1, folder, stub.base_url)
+        try:
+            def timed_get(selected_date):
+                start = time.perf_counter()
+                with urllib.request.urlopen(f"{url}/process_data?date={selected_date}", timeout=300) as response:
+                    response.read()
+                    assert response.status == 200, response.status
+                return time.perf_counter() - start
+
+            cold = [timed_get(selected_date) for selected_date in dates]
+            warm = [timed_get(selected_date) for selected_date in dates]
+            schedule = [dates[index % len(dates)] for index in range(requests_count)]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                latencies = list(pool.map(timed_get, schedule))
+            elapsed = time.perf_counter() - start
+            rss = peak_rss_mb(process.pid)
+        finally:
+            process.terminate()
+            process.wait()
+    return {
+        'cold_p50_ms': percentile(cold, 0.5) * 1000,
+        'cold_max_ms': max(cold) * 1000,
+        'warm_p50_ms': percentile(warm, 0.5) * 1000,
+        'concurrent_p50_ms': percentile(latencies, 0.5) * 1000,
+        'concurrent_p95_ms': percentile(latencies, 0.95) * 1000,
+        'throughput_rps': requests_count / elapsed,
+        'peak_rss_mb': rss,
+    }
+
+
+# Metrics where a larger value is better; for all others smaller is better
+higher_is_better = {'throughput_rps'}
+
+
+def previous_run(history, parameters):
+    if not os.path.exists(history):
+        return None
+    found = None
+    with open(history) as file:
+        for line in file:
+            record = json.loads(line)
+            if record.get('parameters') == parameters:
+                found = record
+    return found
+
+
+def compare(metrics, previous):
+    """Print every metric with its change against the previous comparable run; returns the worst regression."""
+    worst = 0.0
+    for name, value in metrics.items():
+        line = f"{name:<24}{value:12.3f}" if value is not None else f"{name:<24}{'n/a':>12}"
+        old = (previous or {}).get('metrics', {}).get(name)
+        if value is not None and old:
+            change = (value - old) / old
+            regression = -change if name in higher_is_better else change
+            worst = max(worst, regression)
+            line += f"  {change:+7.1%} vs {previous['commit'] or previous['timestamp']}"
+        print(line)
+    return worst
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite and record the results.")
+    parser.add_argument('--rows', type=int, default=20000, help="Rows per synthetic workbook")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cold-dates', type=int, default=10, help="Distinct dates requested cold")
+    parser.add_argument('--requests', type=int, default=200, help="Requests in the concurrent phase")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--persist', default='async', choices=['async', 'sync', 'off'])
+    parser.add_argument('--skip-components', action='store_true')
+    parser.add_argument('--skip-end-to-end', action='store_true')
+    parser.add_argument('--history', default=default_history, help="JSON lines file the results are appended to")
+    parser.add_argument('--no-record', action='store_true', help="Do not append this run to the history")
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help="Exit with status 1 when a metric is this much worse (e.g. 0.2) than the last run")
+    args = parser.parse_args()
+
+    parameters = {'rows': args.rows, 'cold_dates': args.cold_dates, 'requests': args.requests,
+                  'concurrency': args.concurrency, 'persist': args.persist}
+    metrics = {}
+    if not args.skip_components:
+        metrics.update(components(args.rows, args.repeat))
+    if not args.skip_end_to_end:
+        metrics.update(end_to_end(args.rows, args.cold_dates, args.requests, args.concurrency, args.persist))
+
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        'calamine': xlsx_ingest.calamine_available(),
+        'parameters': parameters,
+        'metrics': metrics,
+    }
+    worst = compare(metrics, previous_run(args.history, parameters))
+    if not args.no_record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, 'a') as file:
+            file.write(json.dumps(record) + "\n")
+        print(f"Recorded in {args.history}")
+    if args.max_regression is not None and worst > args.max_regression:
+        print(f"FAIL: {worst:.1%} regression (limit {args.max_regression:.0%})")
+        sys.exit(1)
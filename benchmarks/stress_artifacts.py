@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+sys.path.insert(0, root)
+
+from enex_stub import StubENEX  # noqa: E402
+from result_cache import manifest_name  # noqa: E402
+
+# 20230111 and 20231101 shared one folder ("2023111") before the keys were zero-padded
+default_dates = ['20230111', '20231101', '20230112', '20231201', '20231022']
+
+# One threaded WSGI server per process, the way gunicorn runs several workers on one output_data
+worker_script = """
+from werkzeug.serving import make_server
+import flask_app
+server = make_server('127.0.0.1', 0, flask_app.app, threaded=True)
+print(server.server_port, flush=True)
+server.serve_forever()
+"""
+
+
+def start_workers(count, folder, base_url):
+    env = dict(os.environ, ENEX_BASE_URL=base_url, ENEX_PREFETCH="0",
+               PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    workers = []
+    for _ in range(count):
+        process = subprocess.Popen([sys.executable, '-c', worker_script], cwd=folder, env=env,
+                                   stdout=subprocess.PIPE, text=True)
+        port = int(process.stdout.readline())
+        workers.append((process, f"http://127.0.0.1:{port}"))
+    return workers
+
+
+def get(url, timeout):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, OSError):
+        return None, None
+
+
+# Wait for the background writers: every date gets its manifest once its files are on disk
+def wait_for_manifests(output_folder, dates, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(os.path.exists(os.path.join(output_folder, selected_date, manifest_name('01'))) for selected_date in dates):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def stray_files(output_folder):
+    found = []
+    for folder, folder_names, file_names in os.walk(output_folder):
+        found += [os.path.join(folder, name) for name in file_names if name.endswith(('.tmp', '.part'))]
+    return found
+
+
+def check(output_folder, dates, results, downloads):
+    problems = []
+    for selected_date in dates:
+        statuses = [status for status, _ in results[selected_date]]
+        if any(status != 200 for status in statuses):
+            problems.append(f"{selected_date}: statuses {sorted(set(map(str, statuses)))}")
+            continue
+        bodies = {json.dumps(body['data']['json_data'], sort_keys=True) for _, body in results[selected_date]}
+        if len(bodies) != 1:
+            problems.append(f"{selected_date}: {len(bodies)} different results")
+        folder = os.path.join(output_folder, selected_date)
+        expected = {f"{selected_date}_EL-DAM_Results_EN_v01{suffix}" for suffix in ('.xlsx', '_f.xlsx', '.json')}
+        missing = expected - set(os.listdir(folder)) if os.path.isdir(folder) else expected
+        if missing:
+            problems.append(f"{selected_date}: missing {sorted(missing)}")
+        count = sum(value for path, value in downloads.items() if f"/{selected_date}_" in path)
+        if count != 1:
+            problems.append(f"{selected_date}: downloaded {count} times")
+    problems += [f"stray file {path}" for path in stray_files(output_folder)]
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fire concurrent /process_data requests at several app workers "
+                                                 "sharing one output_data and check the files they leave behind.")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--dates', nargs='+', default=default_dates)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    with StubENEX(rows=args.rows) as stub, tempfile.TemporaryDirectory() as folder:
+        for selected_date in args.dates:
+            stub.workbook(selected_date, 1)
+        workers = start_workers(args.workers, folder, stub.base_url)
+        try:
+            schedule = [(workers[index % len(workers)][1], args.dates[index % len(args.dates)])
+                        for index in range(args.requests)]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                responses = list(pool.map(lambda job: get(f"{job[0]}/process_data?date={job[1]}", args.timeout),
+                                          schedule))
+            elapsed = time.perf_counter() - start
+            output_folder = os.path.join(folder, 'output_data')
+            written = wait_for_manifests(output_folder, args.dates)
+        finally:
+            for process, _ in workers:
+                process.terminate()
+                process.wait()
+
+        results = {selected_date: [] for selected_date in args.dates}
+        for (_, selected_date), response in zip(schedule, responses):
+            results[selected_date].append(response)
+        problems = check(output_folder, args.dates, results, stub.downloads)
+        if not written:
+            problems.append("artifacts were not written within 30 s")
+
+    print(f"{args.requests} requests over {args.workers} workers, concurrency {args.concurrency}, {elapsed:.2f} s")
+    print(f"stub downloads {sum(stub.downloads.values())} for {len(args.dates)} dates")
+    if problems:
+        print("FAILED")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("OK")
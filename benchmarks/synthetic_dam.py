@@ -0,0 +1,56 @@
+import argparse
+import random
+from datetime import date, timedelta
+
+from openpyxl import Workbook
+
+# Column layout of the EL-DAM results workbook published by ENEX
+columns = [
+    'TARGET_DATE', 'SORT', 'DELIVERY_MTU', 'ASSET_DESCR', 'CLASSIFICATION',
+    'SIDE_DESCR', 'TOTAL_TRADES', 'TOTAL_ORDERS', 'MCP', 'VOLUME_UNIT',
+]
+classifications = ['Imports', 'Exports', 'Generation', 'Load', 'Renewables', 'Hydro', 'Thermal']
+sides = ['Sell', 'Buy']
+assets = ['ALBANIA', 'BULGARIA', 'ITALY', 'NORTH MACEDONIA', 'TURKEY', 'SYSTEM', 'AGGREGATED']
+
+
+def generate_rows(rows, target_date=date(2023, 10, 22), periods=24, seed=0):
+    randomizer = random.Random(seed)
+    delivery = target_date.strftime('%Y-%m-%d')
+    for index in range(rows):
+        sort = index % periods + 1
+        start = timedelta(hours=sort - 1)
+        yield [
+            delivery,
+            sort,
+            f"{delivery} {str(start)[:-3].zfill(5)}",
+            randomizer.choice(assets),
+            randomizer.choice(classifications),
+            randomizer.choice(sides),
+            round(randomizer.uniform(0, 500), 3),
+            randomizer.randint(0, 40),
+            round(randomizer.uniform(50, 300), 2),
+            'MWh',
+        ]
+
+
+# Write a synthetic DAM results workbook with the given number of data rows
+def write_workbook(path, rows=10000, target_date=date(2023, 10, 22), seed=0):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('EL-DAM_Results')
+    sheet.append(columns)
+    for row in generate_rows(rows, target_date, seed=seed):
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic EL-DAM results workbook.")
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--date', default='20231022', help="Target date in YYYYMMDD format")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    target = date(int(args.date[:4]), int(args.date[4:6]), int(args.date[6:8]))
+    print(write_workbook(args.path, args.rows, target, args.seed))
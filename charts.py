@@ -0,0 +1,88 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+formats = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def _bar(sns, ax, df):
+    sns.barplot(x='SORT', y='TOTAL_TRADES', data=df, ax=ax)
+    ax.set_title('Bar Plot: Total Trades vs. Sort')
+
+
+def _line(sns, ax, df):
+    sns.lineplot(x='SORT', y='TOTAL_TRADES', data=df, marker='o', ax=ax)
+    ax.set_title('Line Plot: Total Trades vs. Sort')
+
+
+kinds = {'bar': _bar, 'line': _line}
+
+
+# seaborn's "whitegrid" look, set on the axes only: sns.axes_style would swap the
+# process-wide rcParams under charts rendered concurrently by other threads
+def _whitegrid(ax):
+    ax.set_facecolor('white')
+    ax.grid(True, color='.8', linestyle='-')
+    ax.set_axisbelow(True)
+    for spine in ax.spines.values():
+        spine.set_edgecolor('.8')
+    ax.tick_params(length=0)
+
+
+def draw_chart(figure, df, kind):
+    """Draw a chart of the aggregated frame onto an existing matplotlib figure."""
+    import seaborn as sns
+
+    ax = figure.add_subplot()
+    kinds[kind](sns, ax, df)
+    _whitegrid(ax)
+    ax.set_xlabel('SORT (Period of Trade)')
+    ax.set_ylabel('TOTAL_TRADES (Sum of Trades)')
+    return figure
+
+
+def render_chart(df, kind, fmt='png'):
+    """Render a chart of the aggregated frame and return the encoded bytes.
+
+    Uses a standalone Agg figure rather than pyplot, so nothing is kept in
+    global state and the figure is released as soon as it is encoded.
+    matplotlib and seaborn are imported here, on the first chart request.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(10, 6))
+    FigureCanvasAgg(figure)
+    draw_chart(figure, df, kind)
+    buffer = io.BytesIO()
+    try:
+        figure.savefig(buffer, format=fmt)
+    finally:
+        figure.clear()
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """Bounded LRU of encoded charts keyed on (date, data hash, kind, format)."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body):
+        entry = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
@@ -0,0 +1,217 @@
+import argparse
+import glob
+import os
+import re
+import tempfile
+
+import pandas as pd
+
+import artifacts
+import xlsx_ingest
+
+# Date-partitioned Parquet dataset holding every row of every ingested day:
+#   <output folder>/dam_store/date=YYYYMMDD/v##.parquet
+# ENEX_STORE_FOLDER moves it elsewhere, whatever the output folder
+def store_folder_for(output_folder):
+    return os.environ.get("ENEX_STORE_FOLDER") or os.path.join(output_folder, "dam_store")
+
+
+store_folder = store_folder_for("output_data")
+
+# Columns kept as integers; every other numeric column is stored as float64 and
+# everything else as string, so all partitions share one schema
+integer_columns = {'SORT'}
+
+file_pattern = re.compile(r"(\d{8})_EL-DAM_Results_EN_v(\d{2})\.xlsx$")
+
+
+def available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def normalize(df):
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):  # compact frames
+            values = values.astype(values.cat.categories.dtype)
+        if column in integer_columns:
+            columns[column] = pd.to_numeric(values, errors='coerce').astype('Int64')
+        elif values.dtype.kind in 'iuf':
+            columns[column] = values.astype('float64')
+        elif values.dtype.kind == 'b':
+            columns[column] = values
+        else:
+            columns[column] = values.astype('string')
+    return pd.DataFrame(columns)
+
+
+def partition_folder(selected_date, folder=None):
+    return os.path.join(folder or store_folder, f"date={selected_date}")
+
+
+def stored_version(selected_date, folder=None):
+    """Version (e.g. ``'02'``) of the day held in the store, or None."""
+    stored = sorted(os.path.basename(path)[1:3]
+                    for path in glob.glob(os.path.join(partition_folder(selected_date, folder), "v*.parquet")))
+    return stored[-1] if stored else None
+
+
+def append_day(df, selected_date, version, folder=None):
+    """Write the full row set of one day into its partition.
+
+    The file is written next to its final name and renamed into place; older
+    versions of the same day are removed afterwards, so a partition always
+    holds exactly one version, the newest ingested. Ingesting an older
+    version than the one stored is a no-op.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    partition = partition_folder(selected_date, folder)
+    os.makedirs(partition, exist_ok=True)
+    table = pa.Table.from_pandas(normalize(df), preserve_index=False)
+    # Workers ingesting two versions of a day at once must not remove each other's file
+    with artifacts.DateLock(folder or store_folder, selected_date):
+        stored = [os.path.basename(path)[1:3] for path in glob.glob(os.path.join(partition, "v*.parquet"))]
+        if any(existing > version for existing in stored):
+            return partition
+        fd, tmp_path = tempfile.mkstemp(dir=partition, prefix=".part-", suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path, compression='zstd')
+            os.replace(tmp_path, os.path.join(partition, f"v{version}.parquet"))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        for old_file in glob.glob(os.path.join(partition, "v*.parquet")):
+            if os.path.basename(old_file) != f"v{version}.parquet":
+                os.remove(old_file)
+    return partition
+
+
+# Every row and column is read for the store, so always in compact dtypes whatever ENEX_COMPACT says
+def ingest_file(source, selected_date, version, folder=None):
+    df = xlsx_ingest.read_filtered(source, columns=None, filters={}, compact=True)
+    append_day(df, selected_date, version, folder)
+    return df
+
+
+# Parse a downloaded workbook once, store every row and return its Sell/Imports rows.
+# `source` is an open binary file (e.g. a BytesIO of the download); by default file_name is read
+def ingest_and_filter(file_name, folder=None, source=None):
+    match = file_pattern.search(os.path.basename(file_name))
+    df = ingest_file(file_name if source is None else source, match.group(1), match.group(2), folder)
+    filtered_df = df
+    for column, value in xlsx_ingest.default_filters.items():
+        filtered_df = filtered_df[filtered_df[column] == value]
+    return filtered_df[list(xlsx_ingest.default_columns)]
+
+
+def _coerce(value, field_type):
+    import pyarrow.types as types
+    if types.is_integer(field_type):
+        return int(value)
+    if types.is_floating(field_type):
+        return float(value)
+    return value
+
+
+def _dataset(start=None, end=None, filters=None, folder=None):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+    dataset = ds.dataset(folder, format='parquet', partitioning=partitioning)
+
+    expression = None
+    conditions = []
+    if start:
+        conditions.append(ds.field('date') >= start)
+    if end:
+        conditions.append(ds.field('date') <= end)
+    for column, value in (filters or {}).items():
+        field_type = dataset.schema.field(column).type
+        if isinstance(value, (list, tuple, set)):
+            conditions.append(ds.field(column).isin([_coerce(item, field_type) for item in value]))
+        else:
+            conditions.append(ds.field(column) == _coerce(value, field_type))
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset, expression
+
+
+def query(start=None, end=None, columns=None, filters=None, folder=None):
+    """Read rows from the store, touching only the needed partitions and columns.
+
+    ``start``/``end`` (YYYYMMDD, inclusive) prune partitions, ``filters`` maps
+    column names to a value or a list of values and is pushed down to the
+    Parquet reader. The result always carries a ``DATE`` column.
+    """
+    folder = folder or store_folder
+    if not os.path.isdir(folder):
+        return pd.DataFrame(columns=['DATE'] + list(columns or []))
+    dataset, expression = _dataset(start, end, filters, folder)
+    selected = ['date'] + [column for column in (columns or dataset.schema.names) if column != 'date']
+    table = dataset.to_table(columns=selected, filter=expression)
+    return table.to_pandas().rename(columns={'date': 'DATE'}).sort_values('DATE', kind='stable').reset_index(drop=True)
+
+
+def scan(start=None, end=None, columns=None, filters=None, folder=None, batch_size=65536):
+    """Like ``query`` but yields DataFrames of at most ``batch_size`` rows.
+
+    Partitions are read one after the other, in date order, so memory stays
+    bounded by one batch however many days the range covers.
+    """
+    folder = folder or store_folder
+    if not os.path.isdir(folder):
+        return
+    dataset, expression = _dataset(start, end, filters, folder)
+    selected = ['date'] + [column for column in (columns or dataset.schema.names) if column != 'date']
+    import pyarrow.dataset as ds
+
+    dates = sorted({os.path.basename(os.path.dirname(fragment.path))[len("date="):]
+                    for fragment in dataset.get_fragments(filter=expression)})
+    for selected_date in dates:
+        condition = ds.field('date') == selected_date
+        condition = condition if expression is None else expression & condition
+        for batch in dataset.to_batches(columns=selected, filter=condition, batch_size=batch_size):
+            if batch.num_rows:
+                yield batch.to_pandas().rename(columns={'date': 'DATE'})
+
+
+# Ingest every downloaded workbook found under output_folder
+def backfill(output_folder="output_data", folder=None):
+    folder = folder or store_folder_for(output_folder)
+    ingested = 0
+    for file_name in sorted(glob.glob(os.path.join(output_folder, "**", "*.xlsx"), recursive=True)):
+        match = file_pattern.search(os.path.basename(file_name))
+        if not match:
+            continue
+        ingest_file(file_name, match.group(1), match.group(2), folder)
+        ingested += 1
+    return ingested
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the Parquet store of EL-DAM results.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backfill_parser = subparsers.add_parser('backfill', help="Ingest every workbook already in output_data")
+    backfill_parser.add_argument('--output-folder', default="output_data")
+    query_parser = subparsers.add_parser('query', help="Print rows from the store")
+    query_parser.add_argument('--start')
+    query_parser.add_argument('--end')
+    query_parser.add_argument('--columns', help="Comma separated column names")
+    query_parser.add_argument('--filter', action='append', default=[], metavar='COLUMN=VALUE')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        print(f"Ingested {backfill(args.output_folder)} files into {store_folder_for(args.output_folder)}")
+    else:
+        filters = dict(item.split('=', 1) for item in args.filter)
+        columns = args.columns.split(',') if args.columns else None
+        print(query(args.start, args.end, columns, filters).to_string(index=False))
@@ -1,96 +1,81 @@
-from flask import Flask, request, jsonify, render_template
-from datetime import date
+from flask import Blueprint, Flask, current_app, g, request, jsonify, render_template, Response
+import itertools
 import json
-import requests
-import pandas as pd
 import os
-import shutil
-import seaborn as sns
-import matplotlib.pyplot as plt
-import warnings
-from openpyxl import Workbook
+import time
 from collections import OrderedDict
-from pathlib import Path
+import charts
+import formats
+import metrics
+import pipeline
 
-app = Flask(__name__, template_folder="templates")
+# pandas, openpyxl, requests, pyarrow and matplotlib are imported inside the
+# functions that need them, so a new worker starts without loading them
+bp = Blueprint('enex', __name__)
 
-# Suppress the "Workbook contains no default style" warning
-warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl.styles.stylesheet")
+# Aggregation specs requested on top of the default Sell/Imports totals
+def requested_specs():
+    if request.method == 'POST':
+        return pipeline.requested_specs(request.json or {}, json_body=True)
+    return pipeline.requested_specs(request.args)
 
-# Define base URL
-base_url = "https://www.enexgroup.gr/documents/20126/200106/YYYYMMDD_EL-DAM_Results_EN_v##.xlsx"
+# Response format asked for with ?format= or the Accept header; returns (format, error response)
+def requested_format():
+    fmt = formats.negotiate(request)
+    if fmt is None:
+        return None, (jsonify({'error': f"Unsupported format. Use one of {sorted(formats.mimetypes)}."}), 406)
+    if fmt == 'arrow' and not formats.arrow_available():
+        return None, (jsonify({'error': 'Arrow responses require pyarrow.'}), 406)
+    return fmt, None
 
-# Define folder to save files
-output_folder = "output_data"
+# Stream DataFrame chunks as NDJSON, CSV or Arrow IPC
+def streamed(frames, fmt, headers=None):
+    return Response(formats.stream(frames, fmt), mimetype=formats.mimetypes[fmt], headers=headers)
 
-# Create the output folder if it doesn't exist
-os.makedirs(output_folder, exist_ok=True)
+@bp.before_app_request
+def start_request():
+    g.request_start = time.perf_counter()
+    metrics.in_flight.inc()
+    # X-Profile: cprofile|pyinstrument samples this request, when profiling is enabled
+    profile_kind = request.headers.get('X-Profile')
+    if profile_kind and current_app.config.get('PROFILING'):
+        g.profiler = metrics.Profiler(profile_kind.lower()).start()
+    if current_app.config.get('TRACE_MEMORY'):
+        g.memory_tracer = metrics.MemoryTracer().start()
 
-# Define functions
-def download_file(link, output_folder="."):
-    try:
-        response = requests.get(link)
-        if response.status_code == 200:
-            file_name = os.path.join(output_folder, link.split("/")[-1])
-            with open(file_name, 'wb') as file:
-                file.write(response.content)
-            return file_name
-        return None
-    except Exception as e:
-        return None
-    
-def save_chart_as_png(chart, folder, file_name):
-    os.makedirs(folder, exist_ok=True)
-    file_path = os.path.join(folder, file_name)
-    chart.savefig(file_path)
-    return file_path
-# Download a file from a URL and save it
-
-def filter_file(file_name):
-    xlsx_file = file_name
-    df = pd.read_excel(xlsx_file)
-    filtered_df = df[(df['SIDE_DESCR'] == 'Sell') & (df['CLASSIFICATION'] == 'Imports')]
-    sum_of_total_trades = filtered_df.groupby('SORT')['TOTAL_TRADES'].sum().reset_index()
-    return sum_of_total_trades
-
-def df_to_json(df):
-    try:
-        json_data = df.to_json(orient='records', indent=4)
-        return json_data
-    except Exception as e:
-        return None
-
-def create_bar_plot(df):
-    sns.set(style="whitegrid")
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x='SORT', y='TOTAL_TRADES', data=df)
-    plt.xlabel('SORT (Period of Trade)')
-    plt.ylabel('TOTAL_TRADES (Sum of Trades)')
-    plt.title('Bar Plot: Total Trades vs. Sort')
-    return plt
-
-def create_line_plot(df):
-    sns.set(style="whitegrid")
-    plt.figure(figsize=(10, 6))
-    sns.lineplot(x='SORT', y='TOTAL_TRADES', data=df, marker='o')
-    plt.xlabel('SORT (Period of Trade)')
-    plt.ylabel('TOTAL_TRADES (Sum of Trades)')
-    plt.title('Line Plot: Total Trades vs. Sort')
-    return plt
-
-# Define folder to save files
-output_folder = "output_data"
-
-# Create the output folder if it doesn't exist
-os.makedirs(output_folder, exist_ok=True)
-
-# Define functions (keep them as they are)
-
-@app.route('/')
+@bp.after_app_request
+def finish_request(response):
+    elapsed = time.perf_counter() - g.pop('request_start', time.perf_counter())
+    metrics.request_seconds.observe(elapsed, request.endpoint or 'unknown', response.status_code)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profile_folder = os.path.join(pipeline.output_folder, 'profiles')
+        os.makedirs(profile_folder, exist_ok=True)
+        name = f"{(request.endpoint or 'unknown').replace('.', '_')}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        response.headers['X-Profile-File'] = profiler.stop(os.path.join(profile_folder, name))
+    memory_tracer = g.pop('memory_tracer', None)
+    if memory_tracer is not None:
+        response.headers['X-Memory-Peak'] = str(memory_tracer.stop(request.endpoint or 'unknown'))
+    return response
+
+# A workbook too large for ENEX_MEMORY_BUDGET_MB (or the machine) fails this request, not the worker
+@bp.app_errorhandler(MemoryError)
+def memory_exhausted(e):
+    return jsonify({'error': str(e) or "Not enough memory to process this file."}), 503
+
+@bp.teardown_app_request
+def end_request(exception=None):
+    metrics.in_flight.dec()
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/')
 def welcome():
     return render_template('index.html')
 
-@app.route('/process_data', methods=['GET', 'POST'])
+@bp.route('/process_data', methods=['GET', 'POST'])
 def process_data():
     # selected_date = request.json.get('date', None)
     # selected_date = request.args.get('date')
@@ -106,70 +91,42 @@ def process_data():
 
     # Server-side validation for the format and length of the selected_date
     if len(selected_date) == 8 and selected_date.isdigit():
-        year = int(selected_date[:4])
-        month = int(selected_date[4:6])
-        day = int(selected_date[6:8])
-        date_folder = os.path.join(output_folder, f"{year}{month}{day}")
+        date_folder = pipeline.date_folder_for(selected_date)
     else:
         # Return an error response for an invalid date format
         return jsonify({'error': 'Invalid date format. Please provide a date in YYYYMMDD format.'}), 400
 
-    version = "01"
-    formatted_url = base_url.replace("YYYY", str(year)).replace("MM", str(month).zfill(2)).replace("DD", str(day).zfill(2)).replace("##", version)
-    downloaded_file = download_file(formatted_url)
-
-    if downloaded_file:
-        filtered_data = filter_file(downloaded_file)
-        new_file_name = downloaded_file.replace(".xlsx", "_f.xlsx")
-        filtered_data.to_excel(new_file_name, index=False)
-        json_data = df_to_json(filtered_data)
-        output_file_name = f"{downloaded_file[:-5]}.json"
-        with open(output_file_name, 'w') as file:
-            file.write(json_data)
-        
-        
-
-        
-        # Move the downloaded files (XLSX and JSON) to the folder for the selected date
-        # Create the folder path for the output files
-        date_folder = os.path.join(output_folder, f"{year}{month}{day}")
-
-        # Ensure that the date_folder exists
-        os.makedirs(date_folder, exist_ok=True)
-        bar_plot = create_bar_plot(filtered_data)
-        bar_chart_file = save_chart_as_png(bar_plot, date_folder, f"bar_plot_{year}{month}{day}.png")
-        line_plot = create_line_plot(filtered_data)
-        line_plot_file = save_chart_as_png(line_plot, date_folder, f"line_plot_{year}{month}{day}.png")
-        
-        # Move the files to the date-specific folder
-        shutil.move(downloaded_file, os.path.join(date_folder, os.path.basename(downloaded_file)))
-        shutil.move(output_file_name, os.path.join(date_folder, os.path.basename(output_file_name)))
-        shutil.move(new_file_name, os.path.join(date_folder, os.path.basename(new_file_name)))
-        json_data = json.loads(json_data)
-        # Create your custom JSON response
-
-        response = OrderedDict([
-            ('status', 'success'),
-            ('message', 'Data processed successfully'),
-            ('data', OrderedDict([
-                ('selected_date', selected_date),
-                ('selected_date_url', formatted_url),  # Add this line
-                ('json_data', json_data),
-                ('date_folder', f"{date_folder}"),
-                ('files', OrderedDict([
-                    ('xlsx_file', f"{os.path.join(date_folder, os.path.basename(downloaded_file))}"),
-                    ('filtered_xlsx_file', f"{os.path.join(date_folder, os.path.basename(output_file_name))}"),
-                    ('json_data_file', f"{os.path.join(date_folder, os.path.basename(new_file_name))}"),
-                    ('charts', OrderedDict([
-                        ('bar_chart', f"{os.path.join(date_folder, f'bar_plot_{year}{month}{day}.png')}"),
-                        ('line_chart', f"{os.path.join(date_folder, f'line_plot_{year}{month}{day}.png')}")
-                    ]))
-                ]))
-            ]))
-        ])
-
-        response_dict = dict(response)
+    try:
+        if request.method == 'POST':
+            requested_version = pipeline.normalize_version((request.json or {}).get('version', None))
+        else:
+            requested_version = pipeline.normalize_version(request.args.get('version', None))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        specs = requested_specs()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    fmt, error = requested_format()
+    if error:
+        return error
+    if specs and fmt != 'json':
+        return jsonify({'error': 'Aggregations are only returned as JSON.'}), 400
 
+    response_dict = pipeline.load_result(selected_date, date_folder, requested_version)
+    if response_dict is not None and fmt != 'json':
+        import pandas as pd
+        df = pd.DataFrame(response_dict['data']['json_data'], columns=['SORT', 'TOTAL_TRADES'])
+        return streamed([df], fmt, {'X-Source-URL': response_dict['data']['selected_date_url']})
+    if response_dict is not None:
+        if specs:
+            try:
+                aggregations = pipeline.run_aggregations(selected_date, response_dict, specs)
+            except (KeyError, ValueError, TypeError) as e:
+                # Unknown columns (KeyError, or ArrowInvalid from the store) and non-numeric values
+                return jsonify({'error': f'Invalid aggregation: {e}'}), 400
+            response_dict = dict(response_dict, data=dict(response_dict['data'], aggregations=aggregations))
         # Return a success response with a 200 OK status code
         return jsonify(response_dict), 200, print("Data processed successfully:")
     
@@ -177,5 +134,173 @@ def process_data():
         # Return an error response for download failure with a 500 Internal Server Error status code
         return jsonify({'error': 'Error occurred during data processing. Unable to download the file.'}), 500
 
+@bp.route('/charts/<selected_date>/<kind>.<fmt>')
+def chart(selected_date, kind, fmt):
+    if len(selected_date) != 8 or not selected_date.isdigit():
+        return jsonify({'error': 'Invalid date format. Please provide a date in YYYYMMDD format.'}), 400
+    if kind not in charts.kinds or fmt not in charts.formats:
+        return jsonify({'error': f"Unknown chart. Use one of {sorted(charts.kinds)} as {sorted(charts.formats)}."}), 404
+    try:
+        requested_version = pipeline.normalize_version(request.args.get('version', None))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response_dict = pipeline.load_result(selected_date, pipeline.date_folder_for(selected_date), requested_version)
+    if response_dict is None:
+        return jsonify({'error': 'Error occurred during data processing. Unable to download the file.'}), 500
+
+    body, etag = pipeline.get_chart(selected_date, response_dict, kind, fmt)
+
+    if request.headers.get('If-None-Match') == etag:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=charts.formats[fmt])
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+@bp.route('/process_range', methods=['GET', 'POST'])
+def process_range():
+    if request.method == 'GET':
+        start = request.args.get('start', None)
+        end = request.args.get('end', None)
+    elif request.method == 'POST':
+        start = request.json.get('start', None)
+        end = request.json.get('end', None)
+    if not start or not end:
+        return jsonify({'error': 'Please provide start and end dates in YYYYMMDD format.'}), 400
+    fmt, error = requested_format()
+    if error:
+        return error
+
+    import batch
+
+    try:
+        combined, missing_dates = batch.process_range(start, end, pipeline.output_folder)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if fmt != 'json':
+        return streamed(formats.chunks(combined), fmt, {'X-Missing-Dates': ','.join(missing_dates)})
+
+    response = OrderedDict([
+        ('status', 'success'),
+        ('message', 'Data processed successfully'),
+        ('data', OrderedDict([
+            ('start', start),
+            ('end', end),
+            ('json_data', json.loads(combined.to_json(orient='records'))),
+            ('missing_dates', missing_dates),
+        ]))
+    ])
+    return jsonify(dict(response)), 200
+
+@bp.route('/history', methods=['GET'])
+def history():
+    start = request.args.get('start', None)
+    end = request.args.get('end', None)
+    for value in (start, end):
+        if value and (len(value) != 8 or not value.isdigit()):
+            return jsonify({'error': 'Invalid date format. Please provide dates in YYYYMMDD format.'}), 400
+    import dam_store
+    if not dam_store.available():
+        return jsonify({'error': 'The history store requires pyarrow.'}), 501
+
+    fmt, error = requested_format()
+    if error:
+        return error
+
+    columns = request.args.get('columns', None)
+    columns = columns.split(',') if columns else None
+    # Any other query parameter is an equality filter, e.g. SIDE_DESCR=Sell
+    filters = {column: request.args.getlist(column) for column in request.args
+               if column not in ('start', 'end', 'columns', 'format')}
+    if fmt != 'json':
+        # Read partition by partition while the response is sent, so memory does not grow with the range
+        frames = dam_store.scan(start, end, columns, filters, dam_store.store_folder_for(pipeline.output_folder),
+                                batch_size=formats.chunk_rows)
+        try:
+            first = next(frames, None)
+        except (KeyError, ValueError) as e:
+            return jsonify({'error': f'Invalid query: {e}'}), 400
+        if first is None:
+            import pandas as pd
+            first = pd.DataFrame(columns=['DATE'] + list(columns or []))
+        return streamed(itertools.chain([first], frames), fmt)
+    try:
+        df = dam_store.query(start, end, columns, filters, dam_store.store_folder_for(pipeline.output_folder))
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+    response = OrderedDict([
+        ('status', 'success'),
+        ('data', OrderedDict([
+            ('start', start),
+            ('end', end),
+            ('rows', len(df)),
+            ('json_data', json.loads(df.to_json(orient='records'))),
+        ]))
+    ])
+    return jsonify(dict(response)), 200
+
+@bp.route('/timeseries', methods=['GET'])
+def timeseries():
+    start = request.args.get('start', None)
+    end = request.args.get('end', None)
+    for value in (start, end):
+        if value and (len(value) != 8 or not value.isdigit()):
+            return jsonify({'error': 'Invalid date format. Please provide dates in YYYYMMDD format.'}), 400
+    period = request.args.get('period', 'day')
+    sorts = [sort for value in request.args.getlist('sort') for sort in value.split(',') if sort]
+    rolling = request.args.get('rolling', None)
+    if rolling is not None and (not rolling.isdigit() or int(rolling) < 1):
+        return jsonify({'error': 'rolling must be a number of days.'}), 400
+    if any(not sort.isdigit() for sort in sorts):
+        return jsonify({'error': 'sort must be one or more SORT numbers.'}), 400
+    fmt, error = requested_format()
+    if error:
+        return error
+
+    import rollups
+
+    try:
+        df = rollups.query(start, end, period, sorts, int(rolling) if rolling else None,
+                           rollups.database_for(pipeline.output_folder))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if fmt != 'json':
+        return streamed(formats.chunks(df), fmt)
+
+    response = OrderedDict([
+        ('status', 'success'),
+        ('data', OrderedDict([
+            ('start', start),
+            ('end', end),
+            ('period', period),
+            ('json_data', json.loads(df.to_json(orient='records'))),
+        ]))
+    ])
+    return jsonify(dict(response)), 200
+
+def create_app(config=None):
+    app = Flask(__name__, template_folder="templates")
+    app.config['PROFILING'] = os.environ.get("ENEX_PROFILING", "0") == "1"
+    # ENEX_FAST_JSON=1 encodes JSON responses with orjson, without pretty-printing
+    app.config['FAST_JSON'] = os.environ.get("ENEX_FAST_JSON", "0") == "1"
+    # ENEX_TRACE_MEMORY=1 records the peak Python memory of every request
+    app.config['TRACE_MEMORY'] = os.environ.get("ENEX_TRACE_MEMORY", "0") == "1"
+    if config:
+        app.config.update(config)
+    if app.config['FAST_JSON'] and formats.orjson_available():
+        app.json = formats.orjson_provider(app)
+    # Create the output folder if it doesn't exist
+    os.makedirs(pipeline.output_folder, exist_ok=True)
+    app.register_blueprint(bp)
+    # Warm upcoming dates in the background when ENEX_PREFETCH=1
+    import prefetch
+    prefetch.start_from_environment()
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,110 @@
+import io
+
+# Response formats besides the default JSON document. Tabular results are encoded
+# chunk by chunk, so a streamed response starts after the first chunk and never
+# holds more than one encoded chunk in memory.
+mimetypes = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# Rows encoded per chunk of a streamed response
+chunk_rows = 10000
+
+
+def orjson_available():
+    try:
+        import orjson  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def negotiate(request):
+    """Pick a format from ``?format=`` or the Accept header; returns None when unsupported.
+
+    JSON is listed first, so ``*/*`` and a missing Accept header keep the
+    existing JSON document.
+    """
+    fmt = request.args.get('format', None)
+    if fmt is not None:
+        fmt = fmt.lower()
+        return fmt if fmt in mimetypes else None
+    best = request.accept_mimetypes.best_match(list(mimetypes.values()), default=mimetypes['json'])
+    return next((name for name, mimetype in mimetypes.items() if mimetype == best), None)
+
+
+# An empty frame is still yielded once, so CSV gets its header and Arrow its schema
+def chunks(df, rows=None):
+    rows = rows or chunk_rows
+    if len(df) == 0:
+        yield df
+        return
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+def _ndjson(frames):
+    for frame in frames:
+        if len(frame):
+            yield frame.to_json(orient='records', lines=True).rstrip('\n').encode() + b'\n'
+
+
+def _csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode()
+        header = False
+
+
+def _arrow(frames):
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    writer = None
+    for frame in frames:
+        if writer is None:
+            batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        else:
+            batch = pa.RecordBatch.from_pandas(frame, schema=writer.schema, preserve_index=False)
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    if writer is not None:
+        writer.close()
+        yield sink.getvalue()
+
+
+_encoders = {'ndjson': _ndjson, 'csv': _csv, 'arrow': _arrow}
+
+
+def stream(frames, fmt):
+    """Encode an iterable of DataFrames as ``fmt`` ('ndjson', 'csv' or 'arrow'), yielding bytes."""
+    return _encoders[fmt](frames)
+
+
+def orjson_provider(app):
+    """A Flask JSON provider that encodes with orjson and never pretty-prints."""
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+
+    class ORJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    return ORJSONProvider(app)
@@ -0,0 +1,194 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+import metrics
+
+# Defaults, overridable through the environment
+connect_timeout = float(os.environ.get("ENEX_CONNECT_TIMEOUT", 5))
+read_timeout = float(os.environ.get("ENEX_READ_TIMEOUT", 30))
+max_retries = int(os.environ.get("ENEX_RETRIES", 3))
+backoff_base = float(os.environ.get("ENEX_BACKOFF", 0.5))
+backoff_cap = 30.0
+pool_size = int(os.environ.get("ENEX_POOL_SIZE", 16))
+chunk_size = 256 * 1024
+
+# Status codes worth another attempt
+retry_statuses = {429, 500, 502, 503, 504}
+
+# status is the final HTTP status (None when ENEX could not be reached),
+# file_name is set for 200 and for a 304 served from the previous download
+DownloadResult = namedtuple('DownloadResult', ['status', 'file_name', 'headers', 'not_modified', 'size'])
+# Same for in-memory downloads; content holds the body of a 200 response
+FetchResult = namedtuple('FetchResult', ['status', 'content', 'headers'])
+
+_session = None
+_session_lock = threading.Lock()
+
+# ETag/Last-Modified of previous downloads, keyed by URL, used for conditional GETs
+_validators = {}
+_validators_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def backoff_delay(attempt):
+    # Full jitter: a random delay up to the exponential bound
+    return random.uniform(0, min(backoff_cap, backoff_base * 2 ** attempt))
+
+
+def request(method, link, timeout=None, retries=None, **kwargs):
+    """Send a request over the shared session, retrying transient failures.
+
+    Connection errors, timeouts and 429/5xx responses are retried with
+    jittered exponential backoff. Returns the last response, or raises the
+    last ``requests.RequestException`` when no response was received.
+    """
+    timeout = timeout or (connect_timeout, read_timeout)
+    retries = max_retries if retries is None else retries
+    session = get_session()
+    for attempt in range(retries + 1):
+        try:
+            response = session.request(method, link, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.upstream_errors.inc(method)
+            if attempt == retries:
+                raise
+        else:
+            metrics.upstream_responses.inc(method, response.status_code)
+            if response.status_code not in retry_statuses or attempt == retries:
+                return response
+            response.close()
+        time.sleep(backoff_delay(attempt))
+
+
+def head(link, timeout=None, retries=None):
+    try:
+        return request("HEAD", link, timeout=timeout, retries=retries, allow_redirects=True)
+    except requests.RequestException:
+        return None
+
+
+def fetch(link, timeout=None, retries=None):
+    """GET ``link`` into memory and return a ``FetchResult``.
+
+    Used when the body is parsed straight away: nothing touches the disk and
+    the caller decides whether (and when) to keep a copy.
+    """
+    try:
+        response = request("GET", link, timeout=timeout, retries=retries)
+    except requests.RequestException:
+        return FetchResult(None, None, CaseInsensitiveDict())
+    if response.status_code != 200:
+        return FetchResult(response.status_code, None, response.headers)
+    metrics.downloaded_bytes.inc(amount=len(response.content))
+    return FetchResult(200, response.content, response.headers)
+
+
+def _conditional_headers(link):
+    with _validators_lock:
+        validator = _validators.get(link)
+    if validator is None or not os.path.exists(validator['file_name']):
+        return {}, None
+    headers = {}
+    if validator['etag']:
+        headers['If-None-Match'] = validator['etag']
+    if validator['last_modified']:
+        headers['If-Modified-Since'] = validator['last_modified']
+    return headers, validator['file_name']
+
+
+def download(link, output_folder=".", file_name=None, timeout=None, retries=None, progress=None):
+    """Stream ``link`` into ``output_folder`` and return a ``DownloadResult``.
+
+    The body is written in chunks to a temporary file in the target folder
+    and renamed over ``file_name`` once complete, so readers never see a
+    partial file. A repeat download of a URL whose previous file is still on
+    disk is sent as a conditional GET; a 304 reuses that file. ``progress``
+    is called as ``progress(bytes_received, total_bytes_or_None)`` per chunk.
+    """
+    file_name = file_name or os.path.join(output_folder, link.split("/")[-1])
+    headers, previous_file = _conditional_headers(link)
+    try:
+        response = request("GET", link, timeout=timeout, retries=retries, headers=headers, stream=True)
+    except requests.RequestException:
+        return DownloadResult(None, None, CaseInsensitiveDict(), False, 0)
+
+    with response:
+        if response.status_code == 304 and previous_file:
+            if previous_file != file_name:
+                try:
+                    previous_file = _copy_atomic(previous_file, file_name)
+                except OSError:
+                    return DownloadResult(None, None, response.headers, False, 0)
+            return DownloadResult(304, previous_file, response.headers, True, 0)
+        if response.status_code != 200:
+            return DownloadResult(response.status_code, None, response.headers, False, 0)
+
+        folder = os.path.dirname(file_name) or "."
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".download-", suffix=".part")
+        size = 0
+        total = int(response.headers['Content-Length']) if response.headers.get('Content-Length', '').isdigit() else None
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in response.iter_content(chunk_size):
+                    file.write(chunk)
+                    size += len(chunk)
+                    if progress is not None:
+                        progress(size, total)
+            metrics.downloaded_bytes.inc(amount=size)
+            os.replace(tmp_path, file_name)
+        except (OSError, requests.RequestException):
+            _remove_quietly(tmp_path)
+            return DownloadResult(None, None, response.headers, False, 0)
+
+    with _validators_lock:
+        _validators[link] = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'file_name': file_name,
+        }
+    return DownloadResult(200, file_name, response.headers, False, size)
+
+
+def _copy_atomic(source, destination):
+    folder = os.path.dirname(destination) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".download-", suffix=".part")
+    try:
+        with os.fdopen(fd, 'wb') as target, open(source, 'rb') as file:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                target.write(chunk)
+        os.replace(tmp_path, destination)
+    except OSError:
+        _remove_quietly(tmp_path)
+        raise
+    return destination
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,292 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process metrics in the Prometheus text format. Every worker process keeps
+# its own values, so scrape each worker (or run a single worker per container).
+
+logger = logging.getLogger("enex.pipeline")
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+byte_buckets = tuple(megabytes * 1024 * 1024 for megabytes in (1, 4, 16, 64, 128, 256, 512, 1024, 2048, 4096))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def export(self):
+        with self._lock:
+            return dict(self._values)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def merge(self, values):
+        for label_values, amount in values.items():
+            self.inc(*label_values, amount=amount)
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}_total{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            values = {(): self.function()} if self.function else dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=default_buckets):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def export(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+    def merge(self, values):
+        with self._lock:
+            for label_values, (counts, total, count) in values.items():
+                series = self._values.get(label_values)
+                if series is None:
+                    series = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+                series[0] = [mine + theirs for mine, theirs in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+    def render(self):
+        lines = self.header()
+        names = self.labels + ('le',)
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for label_values, (counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(names, label_values + (bound,))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, label_values + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+registry = []
+
+stage_seconds = Histogram("enex_stage_seconds", "Time spent in each processing stage.", ("stage",))
+request_seconds = Histogram("enex_request_seconds", "Request latency per endpoint.", ("endpoint", "status"))
+downloaded_bytes = Counter("enex_downloaded_bytes", "Bytes downloaded from ENEX.")
+upstream_responses = Counter("enex_upstream_responses", "Responses received from ENEX.", ("method", "status"))
+upstream_errors = Counter("enex_upstream_errors", "Requests to ENEX that got no response.", ("method",))
+cache_requests = Counter("enex_cache_requests", "Cache lookups by cache and result.", ("cache", "result"))
+in_flight = Gauge("enex_requests_in_flight", "Requests currently being handled.")
+
+
+def _hit_ratio():
+    hits = cache_requests.value('result', 'hit')
+    total = hits + cache_requests.value('result', 'miss')
+    return hits / total if total else 0.0
+
+
+cache_hit_ratio = Gauge("enex_result_cache_hit_ratio", "Share of result cache lookups served from the cache.",
+                        function=_hit_ratio)
+
+
+def _rss():
+    # Resident set size from /proc (Linux); 0 where it is not available
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _peak_rss():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+rss_bytes = Gauge("enex_process_rss_bytes", "Resident memory of this worker.", function=_rss)
+peak_rss_bytes = Gauge("enex_process_peak_rss_bytes", "Peak resident memory of this worker since it started.",
+                       function=_peak_rss)
+parsed_frame_bytes = Histogram("enex_parsed_frame_bytes", "Memory held by the frame of each parsed workbook.",
+                               buckets=byte_buckets)
+request_peak_bytes = Histogram("enex_request_peak_traced_bytes",
+                               "Peak Python memory allocated while handling a request (ENEX_TRACE_MEMORY=1).",
+                               ("endpoint",), buckets=byte_buckets)
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time a pipeline stage into ``enex_stage_seconds`` and log it as JSON."""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, name)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(dict(fields, stage=name, status=status, seconds=round(elapsed, 6))))
+
+
+# Counters and histograms recorded in a pool worker process are sent back with each result,
+# since /metrics is only served by the parent. Gauges describe one process and stay out of it.
+def run_collected(function, *args):
+    """Run ``function(*args)`` in a worker process; returns ``(result, recorded metrics)``."""
+    for metric in registry:
+        metric.reset()
+    result = function(*args)
+    return result, {metric.name: metric.export() for metric in registry if metric.kind != "gauge"}
+
+
+# Add the metrics recorded by a worker process (see run_collected) to this process
+def merge(recorded):
+    metrics = {metric.name: metric for metric in registry}
+    for name, values in recorded.items():
+        if name in metrics:
+            metrics[name].merge(values)
+
+
+class Profiler:
+    """Sample one request with cProfile or, when installed, pyinstrument."""
+
+    def __init__(self, kind="cprofile"):
+        self.kind = kind
+        if kind == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as Sampler
+            except ImportError:  # Not installed: profile with cProfile instead of failing the request
+                kind = "cprofile"
+            else:
+                self._profiler = Sampler()
+        if kind != "pyinstrument":
+            import cProfile
+            self.kind = "cprofile"
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+        return self
+
+    def stop(self, path_without_extension):
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+            path = f"{path_without_extension}.html"
+            with open(path, 'w') as file:
+                file.write(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            path = f"{path_without_extension}.prof"
+            self._profiler.dump_stats(path)
+        return path
+
+
+class MemoryTracer:
+    """Peak Python allocations of one request, via ``tracemalloc``.
+
+    ``tracemalloc`` is process-wide: with concurrent requests the peak covers
+    everything allocated while this one ran, so it is an upper bound.
+    Tracing slows allocations down, which is why it is opt-in.
+    """
+
+    def start(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return self
+
+    def stop(self, endpoint):
+        import tracemalloc
+        peak = tracemalloc.get_traced_memory()[1]
+        request_peak_bytes.observe(peak, endpoint)
+        return peak
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
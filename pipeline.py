@@ -0,0 +1,303 @@
+import json
+import os
+from collections import OrderedDict
+
+import artifacts
+import charts
+import metrics
+from result_cache import ResultCache, content_digest
+
+# The /process_data pipeline shared by flask_app.py, asgi_app.py and prefetch.py:
+# result cache lookups, the per-date lock, download, parsing, persistence and charts.
+# Nothing here depends on a web framework; pandas, openpyxl, requests, pyarrow and
+# matplotlib are imported inside the functions that need them, so importing it is cheap.
+
+# Define folder to save files
+output_folder = "output_data"
+
+# Cache of processed results, served on repeat requests for the same date
+result_cache = ResultCache(output_folder)
+
+# Encoded charts, rendered on first request to /charts
+chart_cache = charts.ChartCache()
+
+
+def date_folder_for(selected_date):
+    return artifacts.date_folder(output_folder, selected_date)
+
+
+# A version as clients send it (1, "01" or "v02") as two digits; None when none was given
+def normalize_version(version):
+    if version is None:
+        return None
+    version = str(version).lower().lstrip('v').zfill(2)
+    if len(version) != 2 or not version.isdigit():
+        raise ValueError('Invalid version. Please provide a version such as 01 or v02.')
+    return version
+
+
+# Look a date up in the result cache; returns (cached response or None, version to download).
+# Without an explicit version the newest published one is served
+def lookup_cached(selected_date, date_folder, version=None):
+    import processing
+    import versions
+
+    with metrics.stage('cache_lookup', date=selected_date):
+        cached = result_cache.get(selected_date, date_folder, version)
+        if cached is not None:
+            if result_cache.is_fresh(cached):
+                metrics.cache_requests.inc('result', 'hit')
+                return cached['response'], cached['version']
+            next_version = f"{int(cached['version']) + 1:02d}"
+            # A version asked for explicitly stays valid when a newer one is published
+            next_url = None if version else processing.format_url(selected_date, next_version)
+            valid, newer_available = result_cache.revalidate(selected_date, date_folder, cached, next_url)
+            if valid:
+                metrics.cache_requests.inc('result', 'hit')
+                return cached['response'], cached['version']
+            if newer_available and version is None:
+                version = versions.resolve_latest(selected_date, refresh=True) or next_version
+            elif version is None:
+                version = cached['version']
+    metrics.cache_requests.inc('result', 'miss')
+    if version is None:
+        with metrics.stage('resolve_version', date=selected_date):
+            version = versions.resolve_latest(selected_date) or "01"
+    return None, version
+
+
+def cache_result(selected_date, date_folder, version, formatted_url, etag, response_dict, latest=True):
+    files = response_dict['data']['files']
+    result_cache.put(selected_date, date_folder, version, formatted_url, etag, response_dict,
+                     [files['xlsx_file'], files['filtered_xlsx_file'], files['json_data_file']], latest=latest)
+
+
+# Write the artifacts of a processed result and cache it. In async mode the response is
+# cached in memory straight away and the manifest is written once the files are on disk.
+# latest=False caches a version asked for explicitly without serving it as the newest one
+def persist_result(selected_date, date_folder, version, formatted_url, etag, response_dict, items, latest=True):
+    # Asking for the version that is already the newest keeps it the newest
+    previous = result_cache.get(selected_date, date_folder, version)
+    latest = latest or bool(previous and previous.get('latest'))
+    if artifacts.mode != 'sync':
+        result_cache.put(selected_date, date_folder, version, formatted_url, etag, response_dict, persist=False,
+                         latest=latest)
+    if artifacts.mode == 'off':
+        return None
+
+    def store_manifest():
+        # Skip it when the file changed and was cached again while these were being written
+        current = result_cache.get(selected_date, date_folder, version)
+        if current is None or current['etag'] == etag:
+            cache_result(selected_date, date_folder, version, formatted_url, etag, response_dict, latest)
+
+    return artifacts.persist(items, on_written=store_manifest)
+
+
+# Answer from the cache once the date lock is held: another worker may have just processed the date
+def cached_after_lock(selected_date, date_folder, version):
+    cached = result_cache.get(selected_date, date_folder, version)
+    if cached is not None and result_cache.is_fresh(cached):
+        metrics.cache_requests.inc('result', 'shared')
+        return cached['response']
+    return None
+
+
+# Hold the date lock until the artifacts of a result are on disk (or right away when nothing is pending)
+def release_when_written(lock, future):
+    if future is None:
+        lock.release()
+    else:
+        future.add_done_callback(lambda _: lock.release())
+
+
+# Download a file into memory
+def fetch_file(link):
+    import processing
+    return processing.fetch(link)
+
+
+# Return the processed result of a date, from the cache or by downloading and processing it.
+# Only one thread or worker processes a date at a time; the others wait and read its result
+def load_result(selected_date, date_folder, requested_version=None):
+    import processing
+
+    cached_response, version = lookup_cached(selected_date, date_folder, requested_version)
+    if cached_response is not None:
+        return cached_response
+
+    lock = artifacts.DateLock(output_folder, selected_date)
+    with metrics.stage('wait_lock', date=selected_date):
+        lock.acquire()
+    future = None
+    try:
+        cached_response = cached_after_lock(selected_date, date_folder, version)
+        if cached_response is not None:
+            return cached_response
+
+        formatted_url = processing.format_url(selected_date, version)
+        with metrics.stage('download', date=selected_date, url=formatted_url):
+            fetched = fetch_file(formatted_url)
+        if fetched.content is None:
+            return None
+
+        etag = fetched.headers.get('ETag') or f"sha256:{content_digest(fetched.content)}"
+        response_dict, items = process_content(fetched.content, formatted_url.split("/")[-1], selected_date,
+                                               formatted_url, date_folder)
+        # A version asked for explicitly is cached under its own key, not as the newest one
+        with metrics.stage('cache_store', date=selected_date):
+            future = persist_result(selected_date, date_folder, version, formatted_url, etag, response_dict, items,
+                                    latest=requested_version is None)
+        return response_dict
+    finally:
+        release_when_written(lock, future)
+
+
+# Parse and aggregate a workbook held in memory.
+# Returns the response dict and the artifacts (raw, filtered XLSX and JSON) to write to the date folder
+def process_content(content, file_name, selected_date, formatted_url, date_folder):
+    import dam_store
+    import processing
+    import rollups
+
+    with metrics.stage('filter_file', date=selected_date):
+        source = processing.open_bytes(content)
+        if dam_store.available():
+            rows = dam_store.ingest_and_filter(file_name, dam_store.store_folder_for(output_folder), source=source)
+        else:
+            rows = processing.parse(source)
+        filtered_data = processing.aggregate_imports(rows)
+    match = dam_store.file_pattern.search(file_name)
+    if match:
+        with metrics.stage('rollup', date=selected_date):
+            rollups.add_day(selected_date, match.group(2), rows, rollups.database_for(output_folder))
+    with metrics.stage('build_response', date=selected_date):
+        json_data = processing.records(filtered_data)
+    # Chart links name the version, so they draw this file even after a newer one is published
+    chart_query = f"?version={match.group(2)}" if match else ""
+
+    xlsx_file = os.path.join(date_folder, file_name)
+    filtered_xlsx_file = os.path.join(date_folder, file_name.replace(".xlsx", "_f.xlsx"))
+    json_data_file = os.path.join(date_folder, f"{file_name[:-5]}.json")
+    items = [
+        (xlsx_file, 'raw', content),
+        (filtered_xlsx_file, 'xlsx', filtered_data),
+        (json_data_file, 'json', filtered_data),
+    ]
+
+    # Create your custom JSON response
+    response = OrderedDict([
+        ('status', 'success'),
+        ('message', 'Data processed successfully'),
+        ('data', OrderedDict([
+            ('selected_date', selected_date),
+            ('selected_date_url', formatted_url),  # Add this line
+            ('json_data', json_data),
+            ('date_folder', f"{date_folder}"),
+            ('files', OrderedDict([
+                ('xlsx_file', xlsx_file),
+                ('filtered_xlsx_file', filtered_xlsx_file),
+                ('json_data_file', json_data_file),
+                # Charts are rendered on demand by the /charts endpoint
+                ('charts', OrderedDict([
+                    ('bar_chart', f"/charts/{selected_date}/bar.png{chart_query}"),
+                    ('line_chart', f"/charts/{selected_date}/line.png{chart_query}")
+                ]))
+            ]))
+        ]))
+    ])
+
+    return dict(response), items
+
+
+# Hash of the data a chart draws. A file republished under the same v## name gets a new
+# ETag and is processed again; its charts must not be served from the old data
+def chart_digest(response_dict):
+    return content_digest(json.dumps(response_dict['data']['json_data']).encode())[:16]
+
+
+def chart_key(selected_date, response_dict, kind, fmt):
+    return (selected_date, chart_digest(response_dict), kind, fmt)
+
+
+# A rendered chart is kept next to the other artifacts of its date, named after the
+# downloaded file and its data, so that a newer file never serves the chart of an older one
+def chart_path(response_dict, kind, fmt):
+    file_name = response_dict['data']['selected_date_url'].split("/")[-1]
+    return os.path.join(response_dict['data']['date_folder'],
+                        f"{file_name[:-5]}_{chart_digest(response_dict)}_{kind}_chart.{fmt}")
+
+
+def persist_chart(response_dict, kind, fmt, body):
+    artifacts.persist([(chart_path(response_dict, kind, fmt), 'raw', body)])
+
+
+# A chart already rendered by this or another process (e.g. prefetch.py); None when there is none
+def stored_chart(response_dict, kind, fmt):
+    try:
+        with open(chart_path(response_dict, kind, fmt), 'rb') as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+# Return (encoded chart, ETag) for a processed result, rendering it on first use
+def get_chart(selected_date, response_dict, kind, fmt):
+    key = chart_key(selected_date, response_dict, kind, fmt)
+    cached_chart = chart_cache.get(key)
+    if cached_chart is not None:
+        metrics.cache_requests.inc('chart', 'hit')
+        return cached_chart
+    body = stored_chart(response_dict, kind, fmt)
+    if body is not None:
+        metrics.cache_requests.inc('chart', 'stored')
+        return chart_cache.put(key, body)
+    metrics.cache_requests.inc('chart', 'miss')
+    import pandas as pd
+    import processing
+    filtered_data = pd.DataFrame(response_dict['data']['json_data'], columns=['SORT', 'TOTAL_TRADES'])
+    with metrics.stage('render_chart', date=selected_date, kind=kind, format=fmt):
+        cached_chart = chart_cache.put(key, processing.render(filtered_data, kind, fmt))
+    persist_chart(response_dict, kind, fmt, cached_chart[0])
+    return cached_chart
+
+
+# Aggregation specs requested on top of the default Sell/Imports totals, from query
+# parameters or a JSON body; only a JSON body can list several under "aggregations"
+def requested_specs(params, json_body=False):
+    import aggregate
+
+    if json_body and params.get('aggregations'):
+        return [aggregate.spec_from_dict(item) for item in params['aggregations']]
+    if any(params.get(name) for name in ('side', 'classification', 'group_by', 'value', 'agg')):
+        return [aggregate.spec_from_dict(params)]
+    return []
+
+
+# Answer several aggregation specs for one date from a single read of its rows
+def run_aggregations(selected_date, response_dict, specs):
+    import aggregate
+    import dam_store
+    import processing
+
+    columns = aggregate.needed_columns(specs)
+    df = None
+    store_folder = dam_store.store_folder_for(output_folder)
+    match = dam_store.file_pattern.search(response_dict['data']['selected_date_url'])
+    # The store only holds the newest version ingested; an older version is read from its workbook
+    if dam_store.available() and match and dam_store.stored_version(selected_date, store_folder) == match.group(2):
+        df = dam_store.query(selected_date, selected_date, columns, folder=store_folder)
+    if df is None or df.empty:
+        xlsx_file = response_dict['data']['files']['xlsx_file']
+        if os.path.exists(xlsx_file):
+            source = xlsx_file
+        else:
+            # Artifacts are off or not written yet: read the workbook again from ENEX
+            fetched = fetch_file(response_dict['data']['selected_date_url'])
+            if fetched.content is None:
+                raise KeyError(f"workbook for {selected_date} is not available")
+            source = processing.open_bytes(fetched.content)
+        df = processing.parse(source, columns=columns, filters={})
+    results = processing.aggregate_specs(df, specs)
+    return [OrderedDict([('spec', aggregate.spec_to_dict(spec)), ('json_data', json.loads(result.to_json(orient='records')))])
+            for spec, result in zip(specs, results)]
@@ -0,0 +1,174 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger("enex.prefetch")
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def warm_date(selected_date, charts=(('bar', 'png'), ('line', 'png'))):
+    """Process a date through the /process_data path and pre-render its charts.
+
+    Returns True when the date is now warm, False when ENEX has no file yet.
+    """
+    import pipeline
+    response_dict = pipeline.load_result(selected_date, pipeline.date_folder_for(selected_date))
+    if response_dict is None:
+        return False
+    for kind, fmt in charts:
+        pipeline.get_chart(selected_date, response_dict, kind, fmt)
+    return True
+
+
+def is_warm(selected_date):
+    import pipeline
+    return pipeline.result_cache.get(selected_date, pipeline.date_folder_for(selected_date)) is not None
+
+
+class PrefetchScheduler:
+    """Warms the next day's results as soon as ENEX publishes them.
+
+    From ``publish_hour`` (local time) onwards it polls for day D+1 with
+    exponential backoff (``poll_interval`` doubling up to ``max_poll_interval``)
+    until the file is processed, then sleeps until the next publication
+    window. Between polls it backfills dates from ``backfill_from`` up to
+    today that are not in the result cache, at most ``backfill_rate`` dates
+    per minute.
+    """
+
+    def __init__(self, publish_hour=13, poll_interval=30, max_poll_interval=600,
+                 backfill_from=None, backfill_rate=6):
+        self.publish_hour = publish_hour
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backfill_from = backfill_from
+        self.backfill_rate = backfill_rate
+        self._stop = threading.Event()
+        self._thread = None
+        self._backfill_dates = None
+
+    def _pending_backfill(self):
+        if self.backfill_from is None:
+            return []
+        if self._backfill_dates is None:
+            first = datetime.strptime(self.backfill_from, '%Y%m%d').date()
+            days = (date.today() - first).days + 1
+            self._backfill_dates = [(first + timedelta(days=offset)).strftime('%Y%m%d') for offset in range(days)]
+        return self._backfill_dates
+
+    def _warm(self, selected_date):
+        try:
+            return warm_date(selected_date)
+        except Exception:
+            logger.exception("Prefetch of %s failed", selected_date)
+            return False
+
+    # Backfill missing dates until `until` (monotonic time), honouring the rate limit
+    def _backfill_until(self, until):
+        pending = self._pending_backfill()
+        spacing = 60.0 / self.backfill_rate if self.backfill_rate else None
+        while pending and spacing and not self._stop.is_set():
+            selected_date = pending.pop(0)
+            if is_warm(selected_date):
+                continue
+            started = time.monotonic()
+            if self._warm(selected_date):
+                logger.info("Backfilled %s", selected_date)
+            next_start = started + spacing
+            if next_start >= until:
+                break
+            self._stop.wait(max(0.0, next_start - time.monotonic()))
+        self._stop.wait(max(0.0, until - time.monotonic()))
+
+    def _seconds_until_publication(self):
+        now = datetime.now()
+        window = now.replace(hour=self.publish_hour, minute=0, second=0, microsecond=0)
+        if now >= window:
+            return 0.0
+        return (window - now).total_seconds()
+
+    def run(self):
+        warmed_for = None
+        interval = self.poll_interval
+        while not self._stop.is_set():
+            target = (date.today() + timedelta(days=1)).strftime('%Y%m%d')
+            if warmed_for == target or is_warm(target):
+                warmed_for = target
+                # Nothing to poll until tomorrow's publication window
+                now = datetime.now()
+                tomorrow = (now + timedelta(days=1)).replace(hour=self.publish_hour, minute=0, second=0, microsecond=0)
+                self._backfill_until(time.monotonic() + min((tomorrow - now).total_seconds(), 3600))
+                continue
+            wait = self._seconds_until_publication()
+            if wait > 0:
+                self._backfill_until(time.monotonic() + min(wait, 3600))
+                continue
+            if self._warm(target):
+                logger.info("Prefetched %s", target)
+                warmed_for = target
+                interval = self.poll_interval
+            else:
+                self._backfill_until(time.monotonic() + interval)
+                interval = min(interval * 2, self.max_poll_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="enex-prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+# Start one scheduler inside the web process when ENEX_PREFETCH=1. Spawned pool workers
+# re-import the main module (and so `python flask_app.py` builds its app) but never prefetch
+def start_from_environment():
+    global _scheduler
+    if os.environ.get("ENEX_PREFETCH", "0") != "1" or multiprocessing.parent_process() is not None:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrefetchScheduler(
+                publish_hour=int(os.environ.get("ENEX_PREFETCH_PUBLISH_HOUR", 13)),
+                backfill_from=os.environ.get("ENEX_PREFETCH_BACKFILL_FROM") or None,
+                backfill_rate=float(os.environ.get("ENEX_PREFETCH_BACKFILL_RATE", 6)),
+            ).start()
+        return _scheduler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm output_data with newly published DAM results.")
+    parser.add_argument('--publish-hour', type=int, default=13, help="Local hour from which D+1 results are polled")
+    parser.add_argument('--poll-interval', type=float, default=30, help="First retry delay in seconds")
+    parser.add_argument('--max-poll-interval', type=float, default=600)
+    parser.add_argument('--backfill-from', help="Also process missing dates from this date (YYYYMMDD)")
+    parser.add_argument('--backfill-rate', type=float, default=6, help="Backfilled dates per minute")
+    parser.add_argument('--once', action='store_true', help="Warm D+1 and the backfill range once, then exit")
+    args = parser.parse_args()
+
+    import pipeline
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    os.makedirs(pipeline.output_folder, exist_ok=True)
+    scheduler = PrefetchScheduler(args.publish_hour, args.poll_interval, args.max_poll_interval,
+                                  args.backfill_from, args.backfill_rate)
+    if args.once:
+        tomorrow = (date.today() + timedelta(days=1)).strftime('%Y%m%d')
+        print(f"{tomorrow}: {'warm' if warm_date(tomorrow) else 'not published yet'}")
+        for selected_date in scheduler._pending_backfill():
+            if not is_warm(selected_date):
+                print(f"{selected_date}: {'warm' if warm_date(selected_date) else 'not available'}")
+                time.sleep(60.0 / args.backfill_rate if args.backfill_rate else 0)
+    else:
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,122 @@
+import io
+import json
+import os
+
+import aggregate
+import charts
+import http_client
+import xlsx_ingest
+
+# Shared processing core used by flask_app.py, Data_engineer.py and streamlit_app.py.
+# Nothing here prints, prompts or touches Streamlit: front ends pass a `report`
+# callback, called as report(level, message) with level one of
+# "info", "success" or "error", and an optional download `progress` callback.
+
+# Location of the ENEX workbooks, YYYYMMDD and ## being replaced by the date and
+# version (ENEX_BASE_URL points every front end at a mirror or a local stub)
+base_url = os.environ.get(
+    "ENEX_BASE_URL",
+    "https://www.enexgroup.gr/documents/20126/200106/YYYYMMDD_EL-DAM_Results_EN_v##.xlsx",
+)
+
+
+def format_url(selected_date, version="01", url=None):
+    url = url or base_url
+    return url.replace("YYYY", selected_date[:4]).replace("MM", selected_date[4:6]).replace(
+        "DD", selected_date[6:8]).replace("##", version)
+
+
+def null_report(level, message):
+    pass
+
+
+def report_failure(status, link, report):
+    if status == 404:
+        report("error", f'File not found (404 Error) for the specified date: {link}')
+    elif status is None:
+        report("error", f'Error: unable to reach ENEX for the specified date: {link}')
+    else:
+        report("error", f'Error occurred during download ({status} Error) for the specified date: {link}')
+
+
+def download(link, output_folder=".", report=null_report, progress=None):
+    """Download ``link`` into ``output_folder``; returns an http_client.DownloadResult."""
+    result = http_client.download(link, output_folder, progress=progress)
+    if result.file_name:
+        report("success", f'File Download Complete: {result.file_name}')
+    else:
+        report_failure(result.status, link, report)
+    return result
+
+
+def fetch(link, report=null_report):
+    """Download ``link`` into memory; returns an http_client.FetchResult."""
+    result = http_client.fetch(link)
+    if result.content is not None:
+        report("success", f'File Download Complete: {link}')
+    else:
+        report_failure(result.status, link, report)
+    return result
+
+
+def open_bytes(content):
+    """Wrap downloaded bytes so ``parse`` can read them without a temporary file."""
+    return io.BytesIO(content)
+
+
+def parse(source, columns=xlsx_ingest.default_columns, filters=None, engine=None):
+    """Read the Sell/Imports rows (or ``filters``) of a workbook, keeping ``columns``."""
+    return xlsx_ingest.read_filtered(source, columns=columns, filters=filters, engine=engine)
+
+
+def aggregate_imports(df):
+    return xlsx_ingest.aggregate_imports(df)
+
+
+def aggregate_specs(df, specs):
+    return aggregate.aggregate(df, specs)
+
+
+def filter_file(file_name, engine=None):
+    """Parse and aggregate a workbook into total trades per SORT."""
+    return aggregate_imports(parse(file_name, engine=engine))
+
+
+def records(df):
+    """The frame as a list of row dicts, ready for a JSON response (no encode/decode round trip).
+
+    Floats are rounded to 10 decimals, as ``to_json`` did, so the response keeps its values.
+    """
+    return df.round(10).to_dict(orient='records')
+
+
+def to_json(df, indent=4, report=null_report):
+    """Serialize a frame as JSON records; returns None when it cannot be encoded."""
+    try:
+        json_data = df.to_json(orient='records', indent=indent)
+        json.loads(json_data)
+        return json_data
+    except (ValueError, TypeError) as e:
+        report("error", f'Error during JSON conversion: {e}')
+        return None
+
+
+def render(df, kind, fmt='png'):
+    """Encode a bar or line chart of the aggregated frame as PNG or SVG bytes."""
+    return charts.render_chart(df, kind, fmt)
+
+
+def draw(figure, df, kind):
+    """Draw a chart onto a caller-owned matplotlib figure (e.g. a pyplot one)."""
+    return charts.draw_chart(figure, df, kind)
+
+
+def write_text(text, file_name, report=null_report):
+    try:
+        with open(file_name, 'w') as file:
+            file.write(text)
+        report("success", f"JSON data has been written to {file_name} successfully.")
+        return file_name
+    except OSError as e:
+        report("error", f"An error occurred while writing to the file: {e}")
+        return None
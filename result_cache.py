@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# Manifest written next to the processed files of a date, one per version
+def manifest_name(version):
+    return f"cache_v{version}.json"
+
+
+# sha256 of downloaded content, used when ENEX sends no ETag
+def content_digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+# Ask ENEX whether a file exists and which ETag it currently carries
+def probe(link):
+    import http_client
+    response = http_client.head(link)
+    if response is None:
+        return None, None
+    if response.status_code == 200:
+        return True, response.headers.get('ETag')
+    return False, None
+
+
+class ResultCache:
+    """Cache of processed /process_data results keyed on (date, version).
+
+    Entries live in memory (bounded LRU) and in a manifest per version inside
+    the date folder, so results survive restarts. Each entry records the ETag
+    its file had. Results of requests without an explicit version are flagged
+    ``latest``; ``get`` without a version returns the newest of those. An
+    entry is served as-is until it is older than ``revalidate_after`` seconds;
+    after that the caller should revalidate it against ENEX with
+    ``revalidate``.
+    """
+
+    def __init__(self, output_folder="output_data", max_entries=128, revalidate_after=300):
+        self.output_folder = output_folder
+        self.max_entries = max_entries
+        self.revalidate_after = revalidate_after
+        self._entries = OrderedDict()
+        # Newest version cached as latest, per date
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(selected_date, version):
+        return (selected_date, version)
+
+    def _manifest_path(self, date_folder, version):
+        return os.path.join(date_folder, manifest_name(version))
+
+    def _remember(self, entry):
+        key = self.key(entry['selected_date'], entry['version'])
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            selected_date, version = key
+            if entry.get('latest') and version >= self._latest.get(selected_date, ''):
+                self._latest[selected_date] = version
+            elif not entry.get('latest') and self._latest.get(selected_date) == version:
+                del self._latest[selected_date]
+            while len(self._entries) > self.max_entries:
+                (evicted_date, evicted_version), _ = self._entries.popitem(last=False)
+                if self._latest.get(evicted_date) == evicted_version:
+                    del self._latest[evicted_date]
+
+    def _files_present(self, entry):
+        return all(os.path.exists(path) for path in entry.get('files', []))
+
+    def _load_manifest(self, date_folder, version):
+        try:
+            with open(self._manifest_path(date_folder, version)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    # Newest version stored as latest for a date, from memory or the manifests on disk
+    def _latest_version(self, selected_date, date_folder):
+        with self._lock:
+            version = self._latest.get(selected_date)
+        if version is not None:
+            return version
+        try:
+            names = os.listdir(date_folder)
+        except OSError:
+            return None
+        for name in sorted(names, reverse=True):
+            if name.startswith("cache_v") and name.endswith(".json"):
+                entry = self._load_manifest(date_folder, name[len("cache_v"):-len(".json")])
+                # Only the newest version cached can be the latest one
+                if entry is not None:
+                    return entry['version'] if entry.get('latest') else None
+        return None
+
+    def get(self, selected_date, date_folder, version=None):
+        """The entry of ``version``, or without one the newest cached as latest."""
+        if version is None:
+            version = self._latest_version(selected_date, date_folder)
+            if version is None:
+                return None
+        key = self.key(selected_date, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load_manifest(date_folder, version)
+            if entry is None or (entry.get('selected_date'), entry.get('version')) != key:
+                return None
+            self._remember(entry)
+        if not self._files_present(entry):
+            self.invalidate(selected_date, version, date_folder)
+            return None
+        return entry
+
+    def put(self, selected_date, date_folder, version, url, etag, response, files=(), persist=True, latest=True):
+        """Remember a result; with ``persist=False`` it is kept in memory only (no manifest).
+
+        ``latest=False`` stores a version asked for explicitly, which must not
+        be served to requests for the newest version.
+        """
+        entry = {
+            'key': list(self.key(selected_date, version)),
+            'selected_date': selected_date,
+            'version': version,
+            'url': url,
+            'etag': etag,
+            'checked_at': time.time(),
+            'files': list(files),
+            'response': response,
+            'persisted': persist,
+            'latest': latest,
+        }
+        if persist:
+            os.makedirs(date_folder, exist_ok=True)
+            manifest_path = self._manifest_path(date_folder, version)
+            tmp_path = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(entry, file)
+            os.replace(tmp_path, manifest_path)
+        self._remember(entry)
+        return entry
+
+    def invalidate(self, selected_date, version, date_folder=None):
+        with self._lock:
+            self._entries.pop(self.key(selected_date, version), None)
+            if self._latest.get(selected_date) == version:
+                del self._latest[selected_date]
+        if date_folder is not None:
+            try:
+                os.remove(self._manifest_path(date_folder, version))
+            except OSError:
+                pass
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get('checked_at', 0) < self.revalidate_after
+
+    def touch(self, selected_date, date_folder, entry, latest=None):
+        entry['checked_at'] = time.time()
+        return self.put(selected_date, date_folder, entry['version'], entry['url'], entry['etag'],
+                        entry['response'], entry['files'], entry.get('persisted', True),
+                        entry.get('latest', True) if latest is None else latest)
+
+    def revalidate(self, selected_date, date_folder, entry, next_version_url=None):
+        """Check a stale entry against ENEX.
+
+        Returns ``(valid, newer_available)``. With ``next_version_url`` (for
+        entries served as the latest version) a newer ``v##`` file makes the
+        entry stop being the latest; it stays cached for requests asking for
+        its version. A changed ETag or a removed file invalidates the entry. When ENEX cannot be reached the entry is kept, so an outage
+        does not turn into cold misses.
+        """
+        newer_available = False
+        if next_version_url is not None:
+            newer_available = bool(probe(next_version_url)[0])
+        exists, etag = probe(entry['url'])
+        stored_etag = entry['etag']
+        etag_changed = etag and stored_etag and not stored_etag.startswith('sha256:') and etag != stored_etag
+        if exists is False or etag_changed:
+            self.invalidate(selected_date, entry['version'], date_folder)
+            return False, newer_available
+        if newer_available:
+            self.touch(selected_date, date_folder, entry, latest=False)
+            return False, True
+        self.touch(selected_date, date_folder, entry)
+        return True, False
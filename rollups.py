@@ -0,0 +1,210 @@
+import argparse
+import glob
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import pandas as pd
+
+import xlsx_ingest
+
+# SQLite store of precomputed Sell/Imports totals per SORT, by day, ISO week and month.
+#   daily:   one row per (date, SORT) with the sum, count, min and max of TOTAL_TRADES
+#   weekly:  one row per (Monday of the week, SORT), rebuilt from its days
+#   monthly: one row per (YYYYMM, SORT), rebuilt from its days
+# Adding a day touches only that day, its week (7 days) and its month (31 days at
+# most), however long the history is. Range queries never open a workbook.
+# The database lives in the output folder unless ENEX_ROLLUP_DB points elsewhere
+def database_for(output_folder):
+    return os.environ.get("ENEX_ROLLUP_DB") or os.path.join(output_folder, "rollups.sqlite")
+
+
+database = database_for("output_data")
+
+periods = ('day', 'week', 'month')
+
+schema = """
+CREATE TABLE IF NOT EXISTS daily (
+    date TEXT NOT NULL, sort INTEGER NOT NULL, version TEXT NOT NULL,
+    total REAL NOT NULL, count INTEGER NOT NULL, min REAL, max REAL,
+    PRIMARY KEY (date, sort)
+);
+CREATE TABLE IF NOT EXISTS weekly (
+    week TEXT NOT NULL, sort INTEGER NOT NULL,
+    total REAL NOT NULL, count INTEGER NOT NULL, min REAL, max REAL, days INTEGER NOT NULL,
+    PRIMARY KEY (week, sort)
+);
+CREATE TABLE IF NOT EXISTS monthly (
+    month TEXT NOT NULL, sort INTEGER NOT NULL,
+    total REAL NOT NULL, count INTEGER NOT NULL, min REAL, max REAL, days INTEGER NOT NULL,
+    PRIMARY KEY (month, sort)
+);
+"""
+
+# Rebuild one period from its days; the period key and the date bounds are bound in order
+_rebuild = {
+    'weekly': """INSERT INTO weekly (week, sort, total, count, min, max, days)
+                 SELECT ?, sort, SUM(total), SUM(count), MIN(min), MAX(max), COUNT(*)
+                 FROM daily WHERE date BETWEEN ? AND ? GROUP BY sort""",
+    'monthly': """INSERT INTO monthly (month, sort, total, count, min, max, days)
+                  SELECT ?, sort, SUM(total), SUM(count), MIN(min), MAX(max), COUNT(*)
+                  FROM daily WHERE date BETWEEN ? AND ? GROUP BY sort""",
+}
+
+
+def connect(path=None):
+    path = path or database
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # WAL lets web workers read while another one adds a day
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(schema)
+    return connection
+
+
+def _parse_date(selected_date):
+    return date(int(selected_date[:4]), int(selected_date[4:6]), int(selected_date[6:8]))
+
+
+def week_of(selected_date):
+    """Monday of the ISO week of a YYYYMMDD date, as YYYYMMDD."""
+    day = _parse_date(selected_date)
+    return (day - timedelta(days=day.weekday())).strftime('%Y%m%d')
+
+
+def _week_bounds(selected_date):
+    monday = _parse_date(week_of(selected_date))
+    return monday.strftime('%Y%m%d'), (monday + timedelta(days=6)).strftime('%Y%m%d')
+
+
+def _month_bounds(selected_date):
+    return f"{selected_date[:6]}01", f"{selected_date[:6]}31"
+
+
+def summarize(rows):
+    """Per-SORT sum, count, min and max of TOTAL_TRADES over the Sell/Imports rows of one day."""
+    grouped = xlsx_ingest.full_width(rows['TOTAL_TRADES']).groupby(rows['SORT'], observed=True)
+    summary = grouped.agg(['sum', 'count', 'min', 'max']).reset_index()
+    summary['SORT'] = summary['SORT'].astype(int)
+    return summary
+
+
+def add_day(selected_date, version, rows, path=None):
+    """Record the Sell/Imports rows (``SORT``, ``TOTAL_TRADES``) of a day and refresh its week and month.
+
+    A version older than the one stored is ignored; a newer one replaces it.
+    Returns True when the store changed.
+    """
+    summary = summarize(rows)
+    connection = connect(path)
+    try:
+        with connection:
+            stored = connection.execute("SELECT MAX(version) FROM daily WHERE date = ?", (selected_date,)).fetchone()[0]
+            if stored is not None and stored > version:
+                return False
+            connection.execute("DELETE FROM daily WHERE date = ?", (selected_date,))
+            connection.executemany(
+                "INSERT INTO daily (date, sort, version, total, count, min, max) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(selected_date, int(sort), version, float(total), int(count), float(low), float(high))
+                 for sort, total, count, low, high in summary.itertuples(index=False)])
+            for table, column, key, (first, last) in (
+                    ('weekly', 'week', week_of(selected_date), _week_bounds(selected_date)),
+                    ('monthly', 'month', selected_date[:6], _month_bounds(selected_date))):
+                connection.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+                connection.execute(_rebuild[table], (key, first, last))
+        return True
+    finally:
+        connection.close()
+
+
+def add_file(file_name, path=None, source=None):
+    """Add a downloaded workbook; ``source`` may be an open binary file of it."""
+    import dam_store
+    match = dam_store.file_pattern.search(os.path.basename(file_name))
+    rows = xlsx_ingest.read_filtered(file_name if source is None else source)
+    return add_day(match.group(1), match.group(2), rows, path)
+
+
+def query(start=None, end=None, period='day', sorts=None, rolling=None, path=None):
+    """Totals per SORT and period between ``start`` and ``end`` (YYYYMMDD, inclusive).
+
+    Weeks are keyed on their Monday and months on YYYYMM; a week or month is
+    returned when any of its days falls in the range, with ``DAYS`` telling
+    how many of its days are stored. ``rolling`` (days, ``period='day'`` only)
+    adds the mean daily total over that many calendar days, per SORT.
+    """
+    if period not in periods:
+        raise ValueError(f"Unknown period {period!r}. Use one of {list(periods)}.")
+    if rolling and period != 'day':
+        raise ValueError("Rolling means are computed over daily totals; use period=day.")
+    table, key = {'day': ('daily', 'date'), 'week': ('weekly', 'week'), 'month': ('monthly', 'month')}[period]
+    first, last = start, end
+    if period == 'week':
+        first, last = start and week_of(start), end and week_of(end)
+    elif period == 'month':
+        first, last = start and start[:6], end and end[:6]
+    if rolling and first:
+        # Read enough earlier days to fill the first windows
+        first = (_parse_date(first) - timedelta(days=rolling - 1)).strftime('%Y%m%d')
+
+    conditions, parameters = [], []
+    if first:
+        conditions.append(f"{key} >= ?")
+        parameters.append(first)
+    if last:
+        conditions.append(f"{key} <= ?")
+        parameters.append(last)
+    if sorts:
+        conditions.append(f"sort IN ({','.join('?' * len(sorts))})")
+        parameters.extend(int(sort) for sort in sorts)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    days = "1" if period == 'day' else "days"
+    sql = (f"SELECT {key} AS PERIOD, sort AS SORT, total AS TOTAL_TRADES, count AS COUNT, min AS MIN, max AS MAX, "
+           f"total / count AS MEAN, {days} AS DAYS FROM {table} {where} ORDER BY {key}, sort")
+    connection = connect(path)
+    try:
+        df = pd.read_sql_query(sql, connection, params=parameters)
+    finally:
+        connection.close()
+
+    if rolling:
+        dates = pd.to_datetime(df['PERIOD'], format='%Y%m%d')
+        df['ROLLING_MEAN'] = (df.assign(_date=dates).set_index('_date').groupby('SORT')['TOTAL_TRADES']
+                              .transform(lambda totals: totals.rolling(f"{rolling}D").mean()).to_numpy())
+        if start:
+            df = df[df['PERIOD'] >= start].reset_index(drop=True)
+    return df
+
+
+# Rebuild the store from every workbook under output_folder
+def rebuild(output_folder="output_data", path=None):
+    import dam_store
+    path = path or database_for(output_folder)
+    added = 0
+    for file_name in sorted(glob.glob(os.path.join(output_folder, "**", "*.xlsx"), recursive=True)):
+        if dam_store.file_pattern.search(os.path.basename(file_name)):
+            added += add_file(file_name, path)
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily, weekly and monthly Sell/Imports totals per SORT.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = subparsers.add_parser('rebuild', help="Add every workbook already in output_data")
+    rebuild_parser.add_argument('--output-folder', default="output_data")
+    query_parser = subparsers.add_parser('query', help="Print totals for a date range")
+    query_parser.add_argument('--start')
+    query_parser.add_argument('--end')
+    query_parser.add_argument('--period', default='day', choices=periods)
+    query_parser.add_argument('--sort', help="SORT values to keep, comma separated")
+    query_parser.add_argument('--rolling', type=int, help="Add a rolling mean over this many days (period day)")
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        print(f"Added {rebuild(args.output_folder)} files to {database_for(args.output_folder)}")
+    else:
+        sorts = args.sort.split(',') if args.sort else None
+        try:
+            print(query(args.start, args.end, args.period, sorts, args.rolling).to_string(index=False))
+        except ValueError as e:
+            print(f"Error: {e}")
@@ -1,151 +1,139 @@
 import streamlit as st
-import requests
 import pandas as pd
-import json
 import os
-import seaborn as sns
-import matplotlib.pyplot as plt
 from datetime import date
-import shutil
-
-# Define base URL
-base_url = "https://www.enexgroup.gr/documents/20126/200106/YYYYMMDD_EL-DAM_Results_EN_v##.xlsx"
+import artifacts
+import processing
+import versions
 
 # Define folder to save files
 output_folder = "output_data"
 
+# Seconds a downloaded and parsed date stays cached (new versions show up after this)
+cache_ttl = int(os.environ.get("ENEX_STREAMLIT_TTL", 600))
+
 # Create the output folder if it doesn't exist
 os.makedirs(output_folder, exist_ok=True)
 
 # Define functions
-def write_json_to_file(json_data, file_name):
-    try:
-        with open(file_name, 'w') as file:
-            file.write(json_data)
-        st.success(f"JSON data has been written to {file_name} successfully.")
-    except Exception as e:
-        st.error(f"An error occurred while writing to the file: {e}")
-
-def save_chart_as_png(chart, folder, file_name):
-    os.makedirs(folder, exist_ok=True)
-    file_path = os.path.join(folder, file_name)
-    chart.savefig(file_path)
-    return file_path
-# Download a file from a URL and save it
-def download_file(link, output_folder="."):
-    try:
-        response = requests.get(link)
-        if response.status_code == 200:
-            file_name = os.path.join(output_folder, link.split("/")[-1])
-            with open(file_name, 'wb') as file:
-                file.write(response.content)
-            st.success(f'File Download Complete: {file_name}')
-            return file_name
-        else:
-            if response.status_code == 404:
-                st.error(f'File not found (404 Error) for the specified date: {link}')
-            else:
-                st.error(f'Error occurred during download ({response.status_code} Error) for the specified date: {link}')
-            return None
-    except Exception as e:
-        st.error(f'Error: {e}')
-        return None
-# Filter data from an XLSX file
-def filter_file(file_name):
-    xlsx_file = file_name
-    df = pd.read_excel(xlsx_file)
-    filtered_df = df[(df['SIDE_DESCR'] == 'Sell') & (df['CLASSIFICATION'] == 'Imports')]
-    sum_of_total_trades = filtered_df.groupby('SORT')['TOTAL_TRADES'].sum().reset_index()
-    st.text(sum_of_total_trades.to_string(index=False))
-    return sum_of_total_trades
-
-def df_to_json(df):
+# Report progress of the processing core in the page
+def st_report(level, message):
+    {'success': st.success, 'error': st.error}.get(level, st.info)(message)
+
+# A failed download is raised, not returned: st.cache_data keeps return values for the whole
+# TTL, so a timeout or 5xx would otherwise hide the date from every session
+class FetchFailed(Exception):
+    def __init__(self, status, formatted_url):
+        super().__init__(status, formatted_url)
+        self.status = status
+        self.formatted_url = formatted_url
+
+# Download the newest version of a date once per TTL, shared by every session and rerun
+@st.cache_data(ttl=cache_ttl, show_spinner="Downloading from ENEX...")
+def fetch_date(selected_date):
+    version = versions.resolve_latest(selected_date) or "01"
+    formatted_url = processing.format_url(selected_date, version)
+    result = processing.fetch(formatted_url)
+    if result.content is None:
+        raise FetchFailed(result.status, formatted_url)
+    return formatted_url, result.content
+
+# Total trades per SORT of a date, parsed straight from the cached download
+@st.cache_data(ttl=cache_ttl, show_spinner="Parsing...")
+def load_date(selected_date):
+    formatted_url, content = fetch_date(selected_date)
+    totals = processing.filter_file(processing.open_bytes(content))
+    return formatted_url, totals
+
+# Dates whose files were already written by this server process
+@st.cache_resource
+def persisted_dates():
+    return set()
+
+# Save the downloaded, filtered and JSON files of a date once, in the background
+def persist_date(selected_date, formatted_url, totals):
+    persisted = persisted_dates()
+    if selected_date in persisted:
+        return
+    persisted.add(selected_date)
+    _, content = fetch_date(selected_date)
+    file_name = formatted_url.split("/")[-1]
+    date_folder = artifacts.date_folder(output_folder, selected_date)
+    artifacts.persist([
+        (os.path.join(date_folder, file_name), 'raw', content),
+        (os.path.join(date_folder, file_name.replace(".xlsx", "_f.xlsx")), 'xlsx', totals),
+        (os.path.join(date_folder, f"{file_name[:-5]}.json"), 'json', totals),
+    ], persist_mode='async')
+
+# Show one date: table, JSON and native charts
+def show_date(selected_date):
     try:
-        json_data = df.to_json(orient='records', indent=4)
-        if is_valid_json(json_data):
-            st.write("JSON Data:")
-            st.json(json_data)
-            return json_data
-        else:
-            st.error("Not valid JSON data")
-            return None
-    except Exception as e:
-        st.error(f'Error during JSON conversion: {e}')
+        formatted_url, totals = load_date(selected_date)
+    except FetchFailed as e:
+        processing.report_failure(e.status, e.formatted_url, st_report)
         return None
+    persist_date(selected_date, formatted_url, totals)
+    chart_data = totals.set_index('SORT')['TOTAL_TRADES']
+    st.subheader(f"{selected_date[:4]}/{selected_date[4:6]}/{selected_date[6:8]}")
+    st.caption(formatted_url)
+    bar_column, line_column = st.columns(2)
+    bar_column.bar_chart(chart_data)
+    line_column.line_chart(chart_data)
+    with st.expander("JSON Data"):
+        st.json(processing.records(totals))
+    return totals
 
-def create_bar_plot(df):
-    sns.set(style="whitegrid")
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x='SORT', y='TOTAL_TRADES', data=df)
-    plt.xlabel('SORT (Period of Trade)')
-    plt.ylabel('TOTAL_TRADES (Sum of Trades)')
-    plt.title('Bar Plot: Total Trades vs. Sort')
-    return plt
-
-def create_line_plot(df):
-    sns.set(style="whitegrid")
-    plt.figure(figsize=(10, 6))
-    sns.lineplot(x='SORT', y='TOTAL_TRADES', data=df, marker='o')
-    plt.xlabel('SORT (Period of Trade)')
-    plt.ylabel('TOTAL_TRADES (Sum of Trades)')
-    plt.title('Line Plot: Total Trades vs. Sort')
-    return plt
-# Check if a given JSON string is valid
-def is_valid_json(my_json):
+# Compare several dates on one chart, one line per date
+def show_comparison(dates):
+    frames = {}
+    for selected_date in dates:
+        try:
+            _, totals = load_date(selected_date)
+        except FetchFailed:  # Already reported by show_date
+            continue
+        frames[selected_date] = totals.set_index('SORT')['TOTAL_TRADES']
+    if len(frames) < 2:
+        return
+    st.header("Comparison", divider=True)
+    comparison = pd.DataFrame(frames)
+    st.line_chart(comparison)
+    st.dataframe(comparison)
+
+def parse_manual_date(value):
+    if len(value) != 8 or not value.isdigit():
+        return None
     try:
-        json.loads(my_json)
-        return True
-    except json.JSONDecodeError:
-        return False
-# Process data for a given year, month, and day
-def process_data(year, month, day):
-    version = "01"
-    formatted_url = base_url.replace("YYYY", str(year)).replace("MM", str(month).zfill(2)).replace(
-        "DD", str(day).zfill(2)).replace("##", version)
-    downloaded_file = download_file(formatted_url)
-    if downloaded_file is not None:
-        filtered_data = filter_file(downloaded_file)
-        new_file_name = downloaded_file.replace(".xlsx", "_f.xlsx")
-        st.write(f'Changes saved successfully: {new_file_name}')
-        filtered_data.to_excel(new_file_name, index=False)
-        json_str = df_to_json(filtered_data)
-        output_file_name = f"{downloaded_file[:-5]}.json"
-        write_json_to_file(json_str, output_file_name)
-        bar_plot = create_bar_plot(filtered_data)
-        bar_chart_file = save_chart_as_png(bar_plot, os.path.join(output_folder, f"{year}{month}{day}"), "bar_chart.png")
-        line_plot = create_line_plot(filtered_data)
-        line_chart_file = save_chart_as_png(line_plot, os.path.join(output_folder, f"{year}{month}{day}"), "line_chart.png")
-        # Move the downloaded files (XLSX and JSON) to the folder for the selected date
-        date_folder = os.path.join(output_folder, f"{year}{month}{day}")
-        shutil.move(downloaded_file, os.path.join(date_folder, downloaded_file.split("/")[-1]))
-        shutil.move(output_file_name, os.path.join(date_folder, output_file_name.split("/")[-1]))
-        shutil.move(new_file_name, os.path.join(date_folder, new_file_name))
-
-        st.image([bar_chart_file])
-        st.image([line_chart_file])
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    except ValueError:
+        return None
 
 # Streamlit app
 st.title("ENEX Data Analysis")
 st.header("Select by Date", divider=True)
 
-# Initialize the selected date with today's date
-# Add a date picker for selecting a date
-selected_date = st.date_input("Select a date:", min_value=date(2023, 1, 1), max_value=date.today())
-manual_date_input = st.text_input("Enter a date manually (YYYYMMDD):")
+if 'dates' not in st.session_state:
+    st.session_state.dates = []
+
+# A form only reruns the script on submit, not on every keystroke
+with st.form("add_date"):
+    selected_date = st.date_input("Select a date:", min_value=date(2023, 1, 1), max_value=date.today())
+    manual_date_input = st.text_input("Enter a date manually (YYYYMMDD):")
+    submitted = st.form_submit_button("Pick a Date", type="primary")
+
+if submitted:
+    picked = selected_date
+    if manual_date_input:
+        picked = parse_manual_date(manual_date_input)
+        if picked is None:
+            st.error("Invalid date format. Please use the format YYYYMMDD with 8 digits.")
+    if picked is not None and picked.strftime('%Y%m%d') not in st.session_state.dates:
+        st.session_state.dates.append(picked.strftime('%Y%m%d'))
+
+st.session_state.dates = st.multiselect("Selected dates:", st.session_state.dates, default=st.session_state.dates)
 date_summary = st.empty()
+if st.session_state.dates:
+    date_summary.text(f"Selected Dates: {', '.join(st.session_state.dates)}")
 
-if st.button("Pick a Date", key="pick_date_button", type="primary"):
-    if selected_date:
-        year = selected_date.year
-        month = selected_date.month
-        day = selected_date.day
-        date_summary.text(f"Selected Date: {year}/{month}/{day}")
-        process_data(year, month, day)
-
-if manual_date_input and len(manual_date_input) == 8 and manual_date_input.isdigit():
-    year = int(manual_date_input[:4])
-    month = int(manual_date_input[4:6])
-    day = int(manual_date_input[6:8])
-    if year is not None and month is not None and day is not None:
-        date_summary.text(f"Selected Date: {year}/{month}/{day}")
-        process_data(year, month, day)
+for selected_date in st.session_state.dates:
+    show_date(selected_date)
+show_comparison(st.session_state.dates)
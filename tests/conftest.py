@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The app modules live at the repository root and the ENEX stub in benchmarks/
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (root, os.path.join(root, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
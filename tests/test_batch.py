@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("openpyxl")
+
+from enex_stub import StubENEX
+
+import batch
+import processing
+
+start, end = "20240101", "20240103"
+missing = "20240102"
+
+
+@pytest.fixture
+def stub():
+    with StubENEX(rows=200, missing_dates=[missing]) as stub:
+        yield stub
+
+
+def test_process_range_combines_dates(stub, tmp_path):
+    combined, missing_dates = batch.process_range(start, end, str(tmp_path), url=stub.base_url)
+
+    assert list(combined.columns) == ['DATE', 'SORT', 'TOTAL_TRADES']
+    assert sorted(combined['DATE'].unique()) == ["20240101", "20240103"]
+    assert missing_dates == [missing]
+    assert sum(stub.downloads.values()) == 2
+
+
+def test_process_range_rejects_reversed_range(tmp_path):
+    with pytest.raises(ValueError):
+        batch.process_range(end, start, str(tmp_path))
+
+
+def test_process_range_endpoint(stub, tmp_path, monkeypatch):
+    pytest.importorskip("flask")
+    import flask_app
+    import pipeline
+
+    monkeypatch.setenv("ENEX_PREFETCH", "0")
+    monkeypatch.setattr(processing, "base_url", stub.base_url)
+    monkeypatch.setattr(pipeline, "output_folder", str(tmp_path))
+    client = flask_app.create_app({'TESTING': True}).test_client()
+
+    response = client.get(f'/process_range?start={start}&end={end}')
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert {record['DATE'] for record in data['json_data']} == {"20240101", "20240103"}
+    assert data['missing_dates'] == [missing]
+
+    response = client.post('/process_range', json={'start': start})
+    assert response.status_code == 400
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("openpyxl")
+
+from enex_stub import StubENEX
+
+import processing
+from result_cache import ResultCache, manifest_name, probe
+
+selected_date = "20240101"
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with StubENEX(rows=50, versions=2) as stub:
+        monkeypatch.setattr(processing, "base_url", stub.base_url)
+        yield stub
+
+
+@pytest.fixture
+def date_folder(tmp_path):
+    return str(tmp_path / selected_date)
+
+
+def url(version):
+    return processing.format_url(selected_date, version)
+
+
+def put(cache, date_folder, version, etag, latest=True):
+    return cache.put(selected_date, date_folder, version, url(version), etag, {'version': version}, latest=latest)
+
+
+def test_latest_flag_keeps_explicit_versions_apart(tmp_path, date_folder):
+    cache = ResultCache(str(tmp_path))
+    put(cache, date_folder, "01", '"a"')
+    put(cache, date_folder, "02", '"b"', latest=False)
+
+    assert cache.get(selected_date, date_folder)['version'] == "01"
+    assert cache.get(selected_date, date_folder, "02")['response'] == {'version': "02"}
+    assert cache.get(selected_date, date_folder, "03") is None
+
+
+def test_manifests_are_reloaded_after_restart(tmp_path, date_folder):
+    put(ResultCache(str(tmp_path)), date_folder, "01", '"a"', latest=False)
+    put(ResultCache(str(tmp_path)), date_folder, "02", '"b"')
+
+    cache = ResultCache(str(tmp_path))
+    assert os.path.exists(os.path.join(date_folder, manifest_name("02")))
+    assert cache.get(selected_date, date_folder)['version'] == "02"
+    assert cache.get(selected_date, date_folder, "01")['etag'] == '"a"'
+
+
+def test_demoted_version_is_not_served_as_latest_after_restart(tmp_path, date_folder):
+    cache = ResultCache(str(tmp_path))
+    put(cache, date_folder, "01", '"a"')
+    put(cache, date_folder, "02", '"b"', latest=False)
+
+    # A newer version cached explicitly hides an older latest one: it may be outdated
+    assert ResultCache(str(tmp_path)).get(selected_date, date_folder) is None
+
+
+def test_missing_files_drop_the_entry(tmp_path, date_folder):
+    cache = ResultCache(str(tmp_path))
+    cache.put(selected_date, date_folder, "01", url("01"), '"a"', {}, files=[os.path.join(date_folder, "gone.xlsx")])
+
+    assert cache.get(selected_date, date_folder, "01") is None
+    assert not os.path.exists(os.path.join(date_folder, manifest_name("01")))
+
+
+def test_changed_etag_invalidates(stub, tmp_path, date_folder):
+    cache = ResultCache(str(tmp_path))
+    entry = put(cache, date_folder, "01", '"outdated"')
+
+    assert cache.revalidate(selected_date, date_folder, entry) == (False, False)
+    assert cache.get(selected_date, date_folder, "01") is None
+    assert not os.path.exists(os.path.join(date_folder, manifest_name("01")))
+
+
+def test_unchanged_etag_stays_valid(stub, tmp_path, date_folder):
+    cache = ResultCache(str(tmp_path))
+    entry = put(cache, date_folder, "01", probe(url("01"))[1], latest=False)
+
+    assert cache.revalidate(selected_date, date_folder, entry) == (True, False)
+    assert cache.get(selected_date, date_folder, "01") is not None
+
+
+def test_newer_version_takes_over_latest(stub, tmp_path, date_folder):
+    cache = ResultCache(str(tmp_path))
+    entry = put(cache, date_folder, "01", probe(url("01"))[1])
+
+    assert cache.revalidate(selected_date, date_folder, entry, url("02")) == (False, True)
+    assert cache.get(selected_date, date_folder) is None
+    # The older version keeps serving requests that ask for it
+    assert cache.get(selected_date, date_folder, "01")['latest'] is False
+
+
+def test_lookup_cached_moves_to_newer_version(stub, tmp_path, date_folder, monkeypatch):
+    pytest.importorskip("pandas")
+    import pipeline
+
+    cache = ResultCache(str(tmp_path), revalidate_after=0)
+    monkeypatch.setattr(pipeline, "result_cache", cache)
+    put(cache, date_folder, "01", probe(url("01"))[1])
+
+    assert pipeline.lookup_cached(selected_date, date_folder) == (None, "02")
+    # An explicit version is revalidated on its own URL only and still served
+    assert pipeline.lookup_cached(selected_date, date_folder, "01") == ({'version': "01"}, "01")
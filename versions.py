@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Highest v## ever probed, and how many candidates are probed at once
+max_version = 20
+window = 4
+
+# Seconds a resolved version stays valid; past dates rarely get new versions
+ttl = float(os.environ.get("ENEX_VERSION_TTL", 600))
+# Dates with nothing published yet are probed again sooner
+missing_ttl = 60
+
+_latest = {}
+_lock = threading.Lock()
+_pool = ThreadPoolExecutor(window * 2, thread_name_prefix="version-probe")
+
+
+def _exists(selected_date, number, url):
+    import http_client
+    import processing
+    response = http_client.head(processing.format_url(selected_date, f"{number:02d}", url))
+    if response is None:
+        raise ConnectionError("Unable to reach ENEX")
+    return response.status_code == 200
+
+
+def probe_latest(selected_date, url=None):
+    """Find the newest published ``v##`` of a date, or None when none exists.
+
+    Versions are published consecutively, so candidates are probed ``window``
+    at a time with concurrent HEAD requests: the first window answers the
+    common case (v01 only, or a couple of corrections) in one round trip,
+    and each further window is only probed while its predecessor was full.
+    """
+    latest = None
+    for first in range(1, max_version + 1, window):
+        numbers = list(range(first, min(first + window, max_version + 1)))
+        found = list(_pool.map(lambda number: _exists(selected_date, number, url), numbers))
+        for number, exists in zip(numbers, found):
+            if not exists:
+                return latest
+            latest = f"{number:02d}"
+    return latest
+
+
+def resolve_latest(selected_date, url=None, refresh=False):
+    """Return the newest version of a date, cached for ``ttl`` seconds.
+
+    Falls back to the last known version (or None) when ENEX cannot be reached.
+    """
+    import processing
+    key = (selected_date, url or processing.base_url)
+    with _lock:
+        cached = _latest.get(key)
+    if cached and not refresh and cached[1] > time.monotonic():
+        return cached[0]
+    try:
+        version = probe_latest(selected_date, url)
+    except ConnectionError:
+        return cached[0] if cached else None
+    with _lock:
+        _latest[key] = (version, time.monotonic() + (ttl if version else missing_ttl))
+    return version
+
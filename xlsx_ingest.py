@@ -0,0 +1,222 @@
+import os
+import warnings
+
+import pandas as pd
+
+import metrics
+
+# Suppress the "Workbook contains no default style" warning
+warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl.styles.stylesheet")
+
+# Columns needed for the Sell/Imports aggregation
+default_columns = ('SORT', 'TOTAL_TRADES')
+default_filters = {'SIDE_DESCR': 'Sell', 'CLASSIFICATION': 'Imports'}
+
+# Compact mode (ENEX_COMPACT=1): rows are converted to frames in chunks, label
+# columns become categoricals and numbers get the smallest dtype that holds
+# them exactly, so a parse holds a fraction of the memory of a full-width frame
+compact_default = os.environ.get("ENEX_COMPACT", "0") == "1"
+categorical_columns = ('SIDE_DESCR', 'CLASSIFICATION', 'SORT')
+chunk_rows = 50000
+
+# Most memory (MB) the frames of one parse may hold; 0 disables the check
+memory_budget_mb = float(os.environ.get("ENEX_MEMORY_BUDGET_MB", 0))
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """A workbook needs more memory than ``ENEX_MEMORY_BUDGET_MB`` allows."""
+
+
+def calamine_available():
+    try:
+        import python_calamine  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def default_engine():
+    return 'calamine' if calamine_available() else 'openpyxl'
+
+
+# Yield the rows of the first sheet as tuples, header row first
+def _iter_rows_openpyxl(source):
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        for row in sheet.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+
+def _iter_rows_calamine(source):
+    from python_calamine import CalamineWorkbook
+    workbook = CalamineWorkbook.from_object(source)
+    sheet = workbook.get_sheet_by_index(0)
+    if hasattr(sheet, 'iter_rows'):
+        yield from sheet.iter_rows()
+    else:
+        yield from sheet.to_python()
+
+
+_row_readers = {
+    'openpyxl': _iter_rows_openpyxl,
+    'calamine': _iter_rows_calamine,
+}
+
+
+def read_filtered(source, columns=default_columns, filters=None, engine=None, compact=None, memory_budget=None):
+    """Stream the first sheet of a DAM results workbook into a DataFrame.
+
+    Only rows matching every ``column == value`` pair in ``filters`` are kept,
+    and only ``columns`` are materialized (``None`` keeps every column).
+    ``source`` is a path or a binary file object. ``compact`` (default:
+    ``ENEX_COMPACT``) returns compact dtypes, see ``compact``; with a
+    ``memory_budget`` in bytes (default: ``ENEX_MEMORY_BUDGET_MB``) the parse
+    raises ``MemoryBudgetExceeded`` as soon as its frames grow past it.
+    """
+    if filters is None:
+        filters = default_filters
+    if engine is None:
+        engine = default_engine()
+    if compact is None:
+        compact = compact_default
+    if memory_budget is None:
+        memory_budget = memory_budget_mb * 1024 * 1024
+    if engine == 'pandas':
+        usecols = None if columns is None else list(dict.fromkeys(list(columns) + list(filters)))
+        df = pd.read_excel(source, usecols=usecols)
+        for column, value in filters.items():
+            df = df[df[column] == value]
+        df = df if columns is None else df[list(columns)]
+        return _finish([compact_frame(df) if compact else df], memory_budget)
+    rows = _row_readers[engine](source)
+    header = [str(name).strip() if name is not None else '' for name in next(rows, ())]
+    missing = [name for name in list(filters) + list(columns or ()) if name not in header]
+    if missing:
+        raise KeyError(f"Columns not found in workbook: {', '.join(missing)}")
+
+    predicates = [(header.index(column), value) for column, value in filters.items()]
+    if columns is None:
+        columns = [name for name in header if name]
+    positions = [header.index(name) for name in columns]
+    width = len(header)
+    # Without compact mode or a budget the rows are converted in one go, as before
+    chunked = compact or memory_budget
+
+    frames = []
+    held = 0
+    records = []
+    for row in rows:
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        if all(row[index] == value for index, value in predicates):
+            records.append([row[index] for index in positions])
+            if chunked and len(records) >= chunk_rows:
+                frames.append(_frame(records, columns, compact))
+                records = []
+                held += frames[-1].memory_usage(deep=True).sum()
+                _check_budget(held, memory_budget)
+    if records or not frames:
+        frames.append(_frame(records, columns, compact))
+    del records
+    return _finish(frames, memory_budget)
+
+
+def _frame(records, columns, compact):
+    df = _restore_integers(pd.DataFrame.from_records(records, columns=list(columns)).infer_objects())
+    return compact_frame(df) if compact else df
+
+
+def _check_budget(held, memory_budget):
+    if memory_budget and held > memory_budget:
+        raise MemoryBudgetExceeded(
+            f"Parsing needs more than {memory_budget / 1024 / 1024:.0f} MB (ENEX_MEMORY_BUDGET_MB)")
+
+
+# Join the chunks of a parse, record its size and check it against the budget
+def _finish(frames, memory_budget):
+    df = frames[0] if len(frames) == 1 else _concat(frames)
+    frames.clear()
+    size = df.memory_usage(deep=True).sum()
+    metrics.parsed_frame_bytes.observe(size)
+    _check_budget(size, memory_budget)
+    return df
+
+
+def _concat(frames):
+    from pandas.api.types import union_categoricals
+    columns = {}
+    for column in frames[0].columns:
+        parts = [frame[column] for frame in frames]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            try:
+                columns[column] = pd.Series(union_categoricals(parts, sort_categories=True), name=column)
+                continue
+            except TypeError:  # Categories of different types, e.g. numbers in one chunk and text in another
+                parts = [part.astype(object) for part in parts]
+        columns[column] = pd.concat(parts, ignore_index=True)
+    df = pd.DataFrame(columns)
+    # A column's chunks may have been narrowed to different dtypes
+    return compact_frame(df) if any(isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes) else df
+
+
+def compact_frame(df):
+    """Shrink a frame's dtypes without changing its values.
+
+    ``categorical_columns`` and text columns with repeated values become
+    categoricals; integers and floats are narrowed to the smallest dtype that
+    holds every value exactly (float64 stays when float32 would round).
+    """
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        kind = values.dtype.kind
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = values.cat.remove_unused_categories()
+        elif column in categorical_columns or (kind == 'O' and values.nunique() <= len(values) // 2):
+            columns[column] = values.astype('category')
+        elif kind in 'iu':
+            columns[column] = pd.to_numeric(values, downcast='unsigned' if values.min() >= 0 else 'integer')
+        elif kind == 'f' and values.dtype.itemsize > 4:
+            narrow = values.astype('float32')
+            exact = (narrow.astype(values.dtype) == values) | values.isna()
+            columns[column] = narrow if exact.all() else values
+        else:
+            columns[column] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+# Whole-number floats come back as int from pd.read_excel; keep that behaviour
+def _restore_integers(df):
+    for column in df.columns:
+        values = df[column]
+        if values.dtype.kind == 'f' and values.notna().all() and (values % 1 == 0).all():
+            df[column] = values.astype('int64')
+    return df
+
+
+def aggregate_imports(df):
+    totals = full_width(df['TOTAL_TRADES'])
+    result = totals.groupby(df['SORT'], observed=True).sum().reset_index()
+    return plain_dtypes(result)
+
+
+# Narrowed numbers are summed at full width, so compact mode gives the same totals
+def full_width(values):
+    kind = values.dtype.kind
+    if kind == 'f':
+        return values.astype('float64')
+    if kind in 'iu':
+        return values.astype('int64')
+    return values
+
+
+# Categorical columns back to the dtype of their values (for JSON, Excel and SQL)
+def plain_dtypes(df):
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(df[column].cat.categories.dtype)
+    return df